@@ -1,15 +1,104 @@
 # src/core/comparator.py
-from collections import defaultdict
-from typing import List, Tuple, Dict
-from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import List, Tuple, Dict, NamedTuple, Optional
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import multiprocessing as mp
+import logging
+import math
+
+import numpy as np
+
+from .hamming import pairwise_distances, popcount
+from .hasher import PerceptualHasher
+
+logger = logging.getLogger(__name__)
+
+
+class PackedHashes(NamedTuple):
+    """Structure-of-arrays view of a hash table, parsed once per comparison run"""
+    paths: List[str]
+    hashes: List[str]
+    counts: np.ndarray       # float64 frame count per file
+    words: np.ndarray        # uint64 frame hash words per file, zero padded
+    total_bits: np.ndarray   # meaningful hash bits per file
+    word_counts: np.ndarray  # hash words per file before padding
+    suffix_bits: np.ndarray  # set bits in each file's words from every word index onwards
+    bands: np.ndarray        # uint64 LSH band keys per file, see _get_bucket_keys
+
+
+# Packed hashes shared with worker processes, set once per worker by _init_worker
+_worker_packed: PackedHashes = None
+_worker_shms: List[shared_memory.SharedMemory] = []
+
+
+def _suffix_bits(words: np.ndarray) -> np.ndarray:
+    """
+    Set bits in each row from every word index to the end
+    Returns: (n, words + 1) int64 array whose last column is zero
+    """
+    suffix = np.zeros((len(words), words.shape[1] + 1), dtype=np.int64)
+    suffix[:, :-1] = np.cumsum(popcount(words)[:, ::-1], axis=1, dtype=np.int64)[:, ::-1]
+    return suffix
+
+
+def _init_worker(packed: PackedHashes, shared_arrays: Dict[str, Tuple[str, Tuple[int, int]]]):
+    """
+    Attach the worker to the hash words and band keys in shared memory, given as
+    field -> (segment name, shape); the small per-file columns arrive once
+    through the initializer and are not re-pickled per task
+    """
+    global _worker_packed
+    arrays = {}
+    for field, (shm_name, shape) in shared_arrays.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _worker_shms.append(shm)
+        arrays[field] = np.ndarray(shape, dtype=np.uint64, buffer=shm.buf)
+    _worker_packed = packed._replace(suffix_bits=_suffix_bits(arrays['words']), **arrays)
+
+
+def _compare_buckets_worker(comparator: 'EfficientComparator', pairs: np.ndarray,
+                            tasks: List[Tuple[np.ndarray, int, int]]) -> List[Tuple[int, int, float]]:
+    """
+    Compare a partition of candidate pairs and bucket tile rows, given as
+    (bucket, band, first row), inside a worker process
+    """
+    duplicates = comparator._compare_pairs(pairs, _worker_packed)
+    for bucket, band, start in tasks:
+        duplicates.extend(comparator._compare_tile_row(bucket, band, start, _worker_packed))
+    return duplicates
+
 
 class EfficientComparator:
     """O(n) duplicate detection using hash bucketing"""
     
-    def __init__(self, similarity_threshold: float = 0.8, num_workers: int = None):
+    # LSH bands are cut from the words of every textured frame. Their width follows the
+    # threshold: the widest band with which a pair at the threshold's Hamming budget,
+    # its differing bits spread at random, still shares a band with TARGET_RECALL odds
+    TARGET_RECALL = 0.99
+    MIN_BAND_BITS = 4
+    MAX_BAND_BITS = 32
+    
+    # When bands that narrow would make more than this share of unrelated pairs
+    # candidates, bucketing costs more than it saves and every pair is compared
+    MAX_CANDIDATE_FRACTION = 0.25
+    
+    # Fixed cost of comparing one bucket larger than a tile, in pairs of tiled comparison;
+    # bucketing is dropped when bucket overhead and candidate pairs outweigh comparing
+    # every pair once. Smaller buckets are batched into one array of pairs.
+    BUCKET_COST_PAIRS = 500
+    
+    # Bytes of the uint64 XOR temporary one tile of a large bucket materializes; tiles
+    # are square and sized from the hash width so this stays around L2 cache size
+    TILE_BYTES = 1 << 20
+    
+    # Below this many candidate pairs, comparing in-process beats starting a pool
+    PARALLEL_MIN_PAIRS = 1_000_000
+    
+    def __init__(self, similarity_threshold: float = 0.8, num_workers: int = None,
+                 hasher: PerceptualHasher = None):
         self.similarity_threshold = similarity_threshold
         self.num_workers = num_workers or mp.cpu_count()
+        self._default_hasher = hasher or PerceptualHasher()
         
     def find_duplicates(self, file_hashes: Dict[str, str]) -> List[Tuple[str, str, float]]:
         """
@@ -22,85 +111,378 @@ class EfficientComparator:
         if len(file_hashes) < 2:
             return []
         
-        # Step 1: Group by hash buckets - O(n)
-        hash_buckets = self._create_hash_buckets(file_hashes)
+        # Step 1: Parse every hash once and group by hash buckets - O(n)
+        packed = self._pack_hashes(file_hashes)
+        pairs, large_buckets = self._create_hash_buckets(packed)
         
-        # Step 2: Compare within buckets - O(k²) where k << n
-        duplicates = []
+        # Step 2: Compare within buckets - O(k²) where k << n; every pair
+        # is compared once, in the first band its files share
+        duplicates = self._compare_pairs(pairs, packed)
         
-        for bucket_files in hash_buckets.values():
-            if len(bucket_files) > 1:
-                bucket_duplicates = self._compare_bucket(bucket_files, file_hashes)
-                duplicates.extend(bucket_duplicates)
+        for band, bucket in large_buckets:
+            bucket_duplicates = self._compare_bucket(bucket, band, packed)
+            duplicates.extend(bucket_duplicates)
         
-        return duplicates
+        return self._resolve_paths(duplicates, packed)
+    
+    def _resolve_paths(self, duplicates: List[Tuple[int, int, float]],
+                       packed: PackedHashes) -> List[Tuple[str, str, float]]:
+        """Turn index pairs into path pairs"""
+        return [(packed.paths[i], packed.paths[j], similarity) for i, j, similarity in duplicates]
     
-    def _create_hash_buckets(self, file_hashes: Dict[str, str]) -> Dict[str, List[str]]:
-        """Group files by hash bucket for efficient comparison"""
-        buckets = defaultdict(list)
+    def _pack_hashes(self, file_hashes: Dict[str, str]) -> PackedHashes:
+        """Parse hash strings into parallel arrays, skipping empty or malformed hashes"""
+        paths, hashes, counts, rows, total_bits = [], [], [], [], []
         
         for file_path, file_hash in file_hashes.items():
             if not file_hash:
                 continue
             
-            # Use first part of hash as bucket key
-            bucket_key = self._get_bucket_key(file_hash)
-            buckets[bucket_key].append(file_path)
+            unpacked = self._default_hasher.hash_to_words(file_hash)
+            if unpacked is None:
+                continue
+            
+            frame_count, words, bits = unpacked
+            paths.append(file_path)
+            hashes.append(file_hash)
+            counts.append(frame_count)
+            rows.append(words)
+            total_bits.append(bits)
+        
+        n = len(rows)
+        width = max((len(words) for words in rows), default=0)
+        packed_words = np.zeros((n, width), dtype=np.uint64)
+        for i, words in enumerate(rows):
+            packed_words[i, :len(words)] = words
         
-        return buckets
+        frame_counts = np.fromiter(counts, dtype=np.int64, count=n)
+        word_counts = np.fromiter((len(words) for words in rows), dtype=np.int64, count=n)
+        
+        return PackedHashes(
+            paths=paths,
+            hashes=hashes,
+            counts=frame_counts.astype(np.float64),
+            words=packed_words,
+            total_bits=np.fromiter(total_bits, dtype=np.int64, count=n),
+            word_counts=word_counts,
+            suffix_bits=_suffix_bits(packed_words),
+            bands=self._get_bucket_keys(packed_words, word_counts, frame_counts)
+        )
     
-    def _get_bucket_key(self, file_hash: str) -> str:
-        """Extract bucket key from hash for grouping similar hashes"""
-        try:
-            # Use the MD5 part of the hash (more stable)
-            parts = file_hash.split(':', 2)
-            if len(parts) >= 2:
-                # Use first 8 characters of MD5 for bucketing
-                return parts[1][:8]
-            else:
-                return file_hash[:8]
-        except:
-            return "unknown"
-    
-    def _compare_bucket(self, bucket_files: List[str], 
-                       file_hashes: Dict[str, str]) -> List[Tuple[str, str, float]]:
-        """Compare all files within a bucket"""
+    def _create_hash_buckets(self, packed: PackedHashes) -> Tuple[np.ndarray, List[Tuple[int, np.ndarray]]]:
+        """
+        Group files into overlapping LSH buckets, keeping those of two or more files
+        Returns: (pairs, large_buckets). Buckets that fit in one tile are flattened
+        into an (m, 2) array of candidate index pairs, each pair listed once, for
+        the first band its files share. Larger buckets are kept as (band, file
+        indices) for tiled comparison, which skips pairs sharing an earlier band.
+        """
+        n, num_bands = packed.bands.shape
+        no_pairs = np.empty((0, 2), dtype=np.int64)
+        if not n:
+            return no_pairs, []
+        
+        # Every file appears once per band; sort all band keys once and
+        # treat each run of equal keys as a bucket
+        keys = packed.bands.ravel()
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        stops = np.r_[starts[1:], len(order)]
+        shared = stops - starts > 1
+        
+        starts, stops = starts[shared], stops[shared]
+        sizes = stops - starts
+        large = sizes > self._tile_size(packed.words.shape[1])
+        bucket_pairs = int((sizes * (sizes - 1) // 2).sum())
+        if bucket_pairs + self.BUCKET_COST_PAIRS * int(large.sum()) >= n * (n - 1) // 2:
+            return no_pairs, [(0, np.arange(n))]
+        
+        # The sort is stable, so files ascend within every bucket
+        files, bands = np.divmod(order, num_bands)
+        large_buckets = [(int(bands[start]), files[start:stop])
+                         for start, stop in zip(starts[large], stops[large])]
+        pairs, pair_bands = self._bucket_pairs(files, bands, starts[~large], sizes[~large], n)
+        
+        # A pair that met in a large bucket's band first is compared in that bucket
+        for band in sorted({band for band, _ in large_buckets}):
+            met = (pair_bands > band) & (packed.bands[pairs[:, 0], band] == packed.bands[pairs[:, 1], band])
+            pairs, pair_bands = pairs[~met], pair_bands[~met]
+        
+        return pairs, large_buckets
+    
+    def _bucket_pairs(self, files: np.ndarray, bands: np.ndarray, starts: np.ndarray,
+                      sizes: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Every pair within the given buckets, runs of `files` from `starts`
+        Buckets of equal size are expanded together, then pairs found in several
+        bands are reduced to the first of them.
+        Returns: ((m, 2) index pairs with the smaller index first, (m,) bands)
+        """
+        firsts, seconds, pair_bands = [], [], []
+        
+        for size in np.unique(sizes):
+            bucket_starts = starts[sizes == size]
+            members = files[bucket_starts[:, None] + np.arange(size)]
+            a, b = np.triu_indices(size, 1)
+            firsts.append(members[:, a].ravel())
+            seconds.append(members[:, b].ravel())
+            pair_bands.append(np.repeat(bands[bucket_starts], len(a)))
+        
+        if not firsts:
+            return np.empty((0, 2), dtype=np.int64), np.empty(0, dtype=np.int64)
+        
+        firsts, seconds, pair_bands = np.concatenate(firsts), np.concatenate(seconds), np.concatenate(pair_bands)
+        pair_keys = firsts * n + seconds
+        order = np.lexsort((pair_bands, pair_keys))
+        sorted_keys = pair_keys[order]
+        order = order[np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]]
+        
+        return np.stack([firsts[order], seconds[order]], axis=1), pair_bands[order]
+    
+    def _get_bucket_keys(self, words: np.ndarray, word_counts: np.ndarray,
+                         frame_counts: np.ndarray) -> np.ndarray:
+        """
+        Cut the textured frame words of every file into LSH band keys
+        Returns: (n, bands) uint64 array. Keys are tagged with their band index so
+        equal values from different bands never share a bucket, and bands a file
+        cannot use hold a key of their own. A single all-zero band puts every
+        file into one bucket.
+        """
+        n, width = words.shape
+        bandable = self._bandable_words(words, word_counts, frame_counts)
+        reference_bits = int(np.median(bandable.sum(axis=1))) * 64 if n else 0
+        band_bits = self._band_bits(reference_bits)
+        if band_bits is None:
+            return np.zeros((n, 1), dtype=np.uint64)
+        
+        num_bands = width * 64 // band_bits
+        band_mask = np.uint64((1 << band_bits) - 1)
+        unusable = np.uint64(1 << 63) | np.arange(n, dtype=np.uint64) * np.uint64(num_bands)
+        keys = np.empty((n, num_bands), dtype=np.uint64)
+        
+        for band in range(num_bands):
+            first, offset = divmod(band * band_bits, 64)
+            last = (band * band_bits + band_bits - 1) // 64
+            values = words[:, first] >> np.uint64(offset)
+            if last != first:
+                values |= words[:, last] << np.uint64(64 - offset)
+            
+            keys[:, band] = np.where(bandable[:, first] & bandable[:, last],
+                                     (values & band_mask) | np.uint64(band << band_bits),
+                                     unusable + np.uint64(band))
+        
+        return keys
+    
+    def _bandable_words(self, words: np.ndarray, word_counts: np.ndarray,
+                        frame_counts: np.ndarray) -> np.ndarray:
+        """
+        Mask of the hash words that belong to textured frames
+        Flat frames would put every video with a black or faded intro into one
+        bucket. Files without any textured frame band over all their frames, so
+        flat videos can still find each other.
+        """
+        bandable = np.zeros(words.shape, dtype=bool)
+        layouts, inverse = np.unique(np.stack([frame_counts, word_counts], axis=1),
+                                     axis=0, return_inverse=True)
+        
+        for layout, (frame_count, word_count) in enumerate(layouts):
+            files = np.flatnonzero(inverse.ravel() == layout)
+            words_per_frame = word_count // frame_count
+            if not words_per_frame:
+                bandable[files, :word_count] = True
+                continue
+            
+            used = frame_count * words_per_frame
+            frames = words[files, :used].reshape(len(files), frame_count, words_per_frame)
+            textured = self._default_hasher.textured_frames(frames)
+            textured[~textured.any(axis=1)] = True
+            bandable[files, :used] = np.repeat(textured, words_per_frame, axis=1)
+        
+        return bandable
+    
+    def _band_bits(self, reference_bits: int) -> Optional[int]:
+        """
+        Widest LSH band that keeps TARGET_RECALL for a file with reference_bits banded bits
+        Returns: None if such narrow bands would make more than MAX_CANDIDATE_FRACTION
+        of unrelated pairs share a band
+        """
+        if reference_bits <= 0:
+            return None
+        
+        flip_rate = float(self._hamming_budget(reference_bits)) / reference_bits
+        for band_bits in range(self.MAX_BAND_BITS, self.MIN_BAND_BITS - 1, -1):
+            num_bands = reference_bits // band_bits
+            recall = 1.0 - (1.0 - (1.0 - flip_rate) ** band_bits) ** num_bands
+            if recall >= self.TARGET_RECALL:
+                # Two unrelated hashes agree on each bit with even odds
+                candidate_fraction = 1.0 - (1.0 - 0.5 ** band_bits) ** num_bands
+                return band_bits if candidate_fraction <= self.MAX_CANDIDATE_FRACTION else None
+        
+        return None
+    
+    def _compare_pairs(self, pairs: np.ndarray, packed: PackedHashes) -> List[Tuple[int, int, float]]:
+        """
+        Compare explicit (m, 2) index pairs, a tile's worth of pairs at a time
+        Returns: List of (index1, index2, similarity) tuples
+        """
+        tile = self._tile_size(packed.words.shape[1])
         duplicates = []
         
-        for i in range(len(bucket_files)):
-            for j in range(i + 1, len(bucket_files)):
-                file1, file2 = bucket_files[i], bucket_files[j]
-                hash1, hash2 = file_hashes[file1], file_hashes[file2]
-                
-                from .hasher import PerceptualHasher
-                hasher = PerceptualHasher()
-                similarity = hasher.compute_similarity(hash1, hash2)
-                
-                if similarity >= self.similarity_threshold:
-                    duplicates.append((file1, file2, similarity))
+        for start in range(0, len(pairs), tile * tile):
+            first, second = pairs[start:start + tile * tile].T
+            distances = popcount(packed.words[first] ^ packed.words[second]).sum(axis=1, dtype=np.int64)
+            # The longer hash's extra words met zero padding; take their bits back out
+            shared = np.minimum(packed.word_counts[first], packed.word_counts[second])
+            distances -= packed.suffix_bits[first, shared] + packed.suffix_bits[second, shared]
+            
+            total_bits = np.minimum(packed.total_bits[first], packed.total_bits[second])
+            close = distances <= self._hamming_budget(total_bits)
+            duplicates.extend(self._score_pairs(first[close], second[close], distances[close],
+                                                total_bits[close], packed))
+        
+        return duplicates
+    
+    def _compare_bucket(self, bucket: np.ndarray, band: int,
+                        packed: PackedHashes) -> List[Tuple[int, int, float]]:
+        """
+        Compare all files within a bucket, given as indices into the packed hashes
+        Only upper-triangle tiles are computed and matches are emitted per tile,
+        so the full k x k distance matrix is never materialized.
+        Args:
+            band: band the bucket's key came from; pairs sharing an earlier band are skipped
+        Returns: List of (index1, index2, similarity) tuples
+        """
+        duplicates = []
+        for start in range(0, len(bucket), self._tile_size(packed.words.shape[1])):
+            duplicates.extend(self._compare_tile_row(bucket, band, start, packed))
+        return duplicates
+    
+    def _compare_tile_row(self, bucket: np.ndarray, band: int, start: int,
+                          packed: PackedHashes) -> List[Tuple[int, int, float]]:
+        """Compare the tile of bucket files from `start` with itself and every later tile"""
+        tile = self._tile_size(packed.words.shape[1])
+        rows = bucket[start:start + tile]
         
+        duplicates = []
+        for j0 in range(start, len(bucket), tile):
+            duplicates.extend(self._similar_pairs(rows, bucket[j0:j0 + tile], band, packed, j0 == start))
         return duplicates
     
+    def _tile_size(self, width: int) -> int:
+        """Rows per tile for hashes of `width` words"""
+        return max(16, math.isqrt(self.TILE_BYTES // (8 * max(width, 1))))
+    
+    def _similar_pairs(self, rows: np.ndarray, cols: np.ndarray, band: int, packed: PackedHashes,
+                       diagonal: bool) -> List[Tuple[int, int, float]]:
+        """
+        Find pairs of one tile, rows x cols given as file indices, that reach the threshold
+        Pairs are scored as compute_similarity does: hashes of different
+        lengths (e.g. very short videos) are compared over the shorter one's words.
+        Args:
+            band: pairs sharing a band before this one are left to that band's bucket
+            diagonal: rows and cols are the same files; each pair is kept once
+        """
+        distances = pairwise_distances(packed.words[rows], packed.words[cols]).astype(np.int64)
+        row_words, col_words = packed.word_counts[rows], packed.word_counts[cols]
+        if min(row_words.min(), col_words.min()) != max(row_words.max(), col_words.max()):
+            # The longer hash's extra words met zero padding; take their bits back out
+            shared = np.minimum.outer(row_words, col_words)
+            distances -= (packed.suffix_bits[rows[:, None], shared] +
+                          packed.suffix_bits[cols[None, :], shared])
+        
+        # Integer prefilter: pairs over the Hamming budget cannot reach
+        # the threshold even with identical frame counts
+        total_bits = np.minimum.outer(packed.total_bits[rows], packed.total_bits[cols])
+        mask = distances <= self._hamming_budget(total_bits)
+        if diagonal:
+            # Skip self matches and the mirrored lower triangle
+            mask = np.triu(mask, 1)
+        
+        ti, tj = np.nonzero(mask)
+        if band and len(ti):
+            met_before = (packed.bands[rows[ti], :band] == packed.bands[cols[tj], :band]).any(axis=1)
+            ti, tj = ti[~met_before], tj[~met_before]
+        
+        return self._score_pairs(rows[ti], cols[tj], distances[ti, tj], total_bits[ti, tj], packed)
+    
+    def _score_pairs(self, first: np.ndarray, second: np.ndarray, distances: np.ndarray,
+                     total_bits: np.ndarray, packed: PackedHashes) -> List[Tuple[int, int, float]]:
+        """Similarity of index pairs with known bit distances, keeping those that reach the threshold"""
+        if not len(first):
+            return []
+        
+        hasher = self._default_hasher
+        counts_i, counts_j = packed.counts[first], packed.counts[second]
+        count_similarity = np.minimum(counts_i, counts_j) / np.maximum(counts_i, counts_j)
+        hash_similarity = 1.0 - distances / total_bits
+        similarity = (count_similarity * hasher.COUNT_WEIGHT) + (hash_similarity * hasher.HASH_WEIGHT)
+        
+        return [(int(first[k]), int(second[k]), float(similarity[k]))
+                for k in np.flatnonzero(similarity >= self.similarity_threshold)]
+    
+    def _hamming_budget(self, total_bits: np.ndarray) -> np.ndarray:
+        """Largest bit distance that can still reach the similarity threshold"""
+        hasher = self._default_hasher
+        min_hash_similarity = (self.similarity_threshold - hasher.COUNT_WEIGHT) / hasher.HASH_WEIGHT
+        return np.floor((1.0 - min_hash_similarity) * total_bits + 1e-9).astype(np.int64)
+    
     def find_duplicates_parallel(self, file_hashes: Dict[str, str]) -> List[Tuple[str, str, float]]:
         """Parallel version for large datasets"""
-        hash_buckets = self._create_hash_buckets(file_hashes)
+        packed = self._pack_hashes(file_hashes)
+        pairs, large_buckets = self._create_hash_buckets(packed)
         
-        # Process buckets in parallel
-        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
-            futures = []
-            
-            for bucket_files in hash_buckets.values():
-                if len(bucket_files) > 1:
-                    future = executor.submit(self._compare_bucket, bucket_files, file_hashes)
-                    futures.append(future)
+        candidate_pairs = len(pairs) + sum(len(bucket) * (len(bucket) - 1) // 2 for _, bucket in large_buckets)
+        if self.num_workers < 2 or candidate_pairs < self.PARALLEL_MIN_PAIRS:
+            duplicates = self._compare_pairs(pairs, packed)
+            for band, bucket in large_buckets:
+                duplicates.extend(self._compare_bucket(bucket, band, packed))
+            return self._resolve_paths(duplicates, packed)
+        
+        # Large buckets are split into tile rows, so one bucket (every file, when
+        # bands cannot prune) still spreads across workers
+        tile = self._tile_size(packed.words.shape[1])
+        tasks = [(bucket, band, start) for band, bucket in large_buckets
+                 for start in range(0, len(bucket), tile)]
+        
+        # Static partitioning: an even share of the candidate pairs, and tile rows
+        # largest first, dealt round-robin so every worker receives a similar
+        # number of pairs in a single task
+        tasks.sort(key=lambda task: len(task[0]) - task[2], reverse=True)
+        num_partitions = self.num_workers
+        partitions = [(pair_share, tasks[i::num_partitions])
+                      for i, pair_share in enumerate(np.array_split(pairs, num_partitions))]
+        
+        # Hash words and band keys go through shared memory; workers only receive
+        # file indices, and pickling shares one bucket array between the rows of a partition
+        segments, shared_arrays = [], {}
+        duplicates = []
+        try:
+            for field in ('words', 'bands'):
+                array = getattr(packed, field)
+                shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                segments.append(shm)
+                np.ndarray(array.shape, dtype=np.uint64, buffer=shm.buf)[:] = array
+                shared_arrays[field] = (shm.name, array.shape)
             
-            # Collect results
-            duplicates = []
-            for future in futures:
-                try:
-                    bucket_duplicates = future.result()
-                    duplicates.extend(bucket_duplicates)
-                except Exception as e:
-                    print(f"Error in parallel comparison: {e}")
-        
-        return duplicates
\ No newline at end of file
+            # Spawned, as the scanner's hashing pool, since scans run on a GUI thread
+            with ProcessPoolExecutor(max_workers=num_partitions, initializer=_init_worker,
+                                     initargs=(packed._replace(words=None, suffix_bits=None, bands=None),
+                                               shared_arrays),
+                                     mp_context=mp.get_context("spawn")) as executor:
+                futures = [executor.submit(_compare_buckets_worker, self, pair_share, partition)
+                           for pair_share, partition in partitions]
+                
+                # Collect results
+                for future in futures:
+                    try:
+                        bucket_duplicates = future.result()
+                        duplicates.extend(bucket_duplicates)
+                    except Exception:
+                        logger.exception("Error in parallel comparison")
+        finally:
+            for shm in segments:
+                shm.close()
+                shm.unlink()
+        
+        return self._resolve_paths(duplicates, packed)
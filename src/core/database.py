@@ -2,21 +2,53 @@
 import sqlite3
 import json
 import os
-from pathlib import Path
 from typing import Optional, Dict, List, Tuple
 from datetime import datetime
+from contextlib import contextmanager
 import hashlib
+import threading
 
 class VideoDatabase:
     """SQLite database for efficient video metadata and hash storage"""
     
     def __init__(self, db_path: str = "video_duplicates.db"):
         self.db_path = db_path
+        
+        # One connection for the lifetime of the database, shared across threads
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._configure_connection()
         self._init_database()
     
+    def _configure_connection(self):
+        """Apply connection pragmas once"""
+        cursor = self._conn.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA temp_store=MEMORY')
+        cursor.execute('PRAGMA mmap_size=268435456')
+    
+    @contextmanager
+    def _connect(self):
+        """Yield the shared connection; commits on success, rolls back on error"""
+        with self._lock:
+            with self._conn:
+                yield self._conn
+    
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
     def _init_database(self):
         """Initialize database with required tables"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             # Files table for storing video metadata and hashes
@@ -63,12 +95,20 @@ class VideoDatabase:
                 CREATE INDEX IF NOT EXISTS idx_group_hash ON duplicate_groups(group_hash)
             ''')
             
+            # Indexes for removing a file's duplicate relationships
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_dg_file1 ON duplicate_groups(file1_path)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_dg_file2 ON duplicate_groups(file2_path)
+            ''')
+            
             conn.commit()
     
     def store_file_hash(self, file_path: str, file_hash: str, file_info: Dict):
         """Store file hash and metadata"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('''
@@ -90,19 +130,59 @@ class VideoDatabase:
         except Exception as e:
             print(f"Error storing file hash for {file_path}: {e}")
     
-    def get_file_hash(self, file_path: str) -> Optional[str]:
-        """Get cached hash for a file if it exists and is still valid"""
+    def store_many_file_hashes(self, entries: List[Tuple[str, str, Dict]]):
+        """Store (file_path, file_hash, file_info) entries in a single transaction"""
+        if not entries:
+            return
+        
         try:
-            # Check if file still exists and hasn't been modified
-            if not os.path.exists(file_path):
-                self._remove_file(file_path)
-                return None
+            scan_date = datetime.now().isoformat()
+            rows = [(
+                file_path,
+                file_hash,
+                file_info.get('size', 0),
+                file_info.get('modified', ''),
+                file_info.get('created', ''),
+                scan_date,
+                json.dumps(file_info)
+            ) for file_path, file_hash, file_info in entries]
+            
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                
+                cursor.executemany('''
+                    INSERT OR REPLACE INTO files 
+                    (file_path, file_hash, file_size, file_modified, file_created, scan_date, metadata)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+                
+                conn.commit()
+                
+        except Exception as e:
+            print(f"Error storing {len(entries)} file hashes: {e}")
+    
+    def get_file_hash(self, file_path: str, size: Optional[int] = None,
+                      mtime: Optional[float] = None) -> Optional[str]:
+        """
+        Get cached hash for a file if it exists and is still valid
+        Args:
+            file_path: Path of the video file
+            size, mtime: Current st_size/st_mtime if the caller already stat'ed the file
+        """
+        try:
+            if size is None or mtime is None:
+                # Check if file still exists and hasn't been modified
+                if not os.path.exists(file_path):
+                    self._remove_file(file_path)
+                    return None
+                
+                file_stat = os.stat(file_path)
+                size, mtime = file_stat.st_size, file_stat.st_mtime
             
-            file_stat = os.stat(file_path)
-            current_modified = datetime.fromtimestamp(file_stat.st_mtime).isoformat()
-            current_size = file_stat.st_size
+            current_modified = datetime.fromtimestamp(mtime).isoformat()
+            current_size = size
             
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('''
@@ -129,10 +209,41 @@ class VideoDatabase:
             print(f"Error getting file hash for {file_path}: {e}")
             return None
     
+    def get_file_hashes_bulk(self, file_paths: List[str]) -> Dict[str, Tuple[str, str, int]]:
+        """
+        Get stored entries for many files with a single query
+        Returns: Dict mapping file path to (file_hash, file_modified, file_size);
+        validating them against the files on disk is left to the caller
+        """
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute('''
+                    CREATE TEMP TABLE IF NOT EXISTS lookup_paths (file_path TEXT PRIMARY KEY)
+                ''')
+                cursor.execute('DELETE FROM lookup_paths')
+                cursor.executemany('INSERT OR IGNORE INTO lookup_paths (file_path) VALUES (?)',
+                                   ((file_path,) for file_path in file_paths))
+                
+                cursor.execute('''
+                    SELECT f.file_path, f.file_hash, f.file_modified, f.file_size 
+                    FROM files f
+                    JOIN lookup_paths l ON l.file_path = f.file_path
+                ''')
+                results = {row[0]: (row[1], row[2], row[3]) for row in cursor.fetchall()}
+                
+                cursor.execute('DELETE FROM lookup_paths')
+                return results
+                
+        except Exception as e:
+            print(f"Error getting file hashes: {e}")
+            return {}
+    
     def store_file_thumbnail(self, file_path: str, thumbnail_path: str):
         """Store thumbnail path for a file"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('''
@@ -149,7 +260,7 @@ class VideoDatabase:
     def get_file_thumbnail(self, file_path: str) -> Optional[str]:
         """Get thumbnail path for a file"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('''
@@ -190,7 +301,7 @@ class VideoDatabase:
                 "|".join(sorted(file_paths)).encode()
             ).hexdigest()
             
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 # Clear existing duplicates for this group
@@ -199,14 +310,15 @@ class VideoDatabase:
                     WHERE group_hash = ?
                 ''', (group_hash,))
                 
-                # Insert new duplicates
+                # Insert new duplicates in one statement batch
                 scan_date = datetime.now().isoformat()
-                for file1, file2, similarity in duplicates:
-                    cursor.execute('''
-                        INSERT INTO duplicate_groups 
-                        (group_hash, file1_path, file2_path, similarity_score, scan_date)
-                        VALUES (?, ?, ?, ?, ?)
-                    ''', (group_hash, file1, file2, similarity, scan_date))
+                rows = [(group_hash, file1, file2, similarity, scan_date)
+                        for file1, file2, similarity in duplicates]
+                cursor.executemany('''
+                    INSERT INTO duplicate_groups 
+                    (group_hash, file1_path, file2_path, similarity_score, scan_date)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', rows)
                 
                 conn.commit()
                 
@@ -216,7 +328,7 @@ class VideoDatabase:
     def get_all_files(self) -> List[Dict]:
         """Get all files from database"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('''
@@ -253,7 +365,7 @@ class VideoDatabase:
     def get_files_count(self) -> int:
         """Get total number of files in database"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('SELECT COUNT(*) FROM files')
                 result = cursor.fetchone()
@@ -264,7 +376,7 @@ class VideoDatabase:
     def get_duplicates_count(self) -> int:
         """Get total number of duplicate pairs"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('SELECT COUNT(*) FROM duplicate_groups')
                 result = cursor.fetchone()
@@ -275,7 +387,7 @@ class VideoDatabase:
     def clear_all(self):
         """Clear all data from database"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('DELETE FROM duplicate_groups')
                 cursor.execute('DELETE FROM files')
@@ -283,31 +395,43 @@ class VideoDatabase:
         except Exception as e:
             print(f"Error clearing database: {e}")
     
+    def remove_files(self, file_paths: List[str]):
+        """Remove entries and duplicate relationships for the given files"""
+        self._remove_files(file_paths)
+    
     def _remove_file(self, file_path: str):
         """Remove file from database"""
+        self._remove_files([file_path])
+    
+    def _remove_files(self, file_paths: List[str]):
+        """Remove several files from database in one transaction"""
+        if not file_paths:
+            return
+        
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            rows = [(file_path,) for file_path in file_paths]
+            with self._connect() as conn:
                 cursor = conn.cursor()
-                cursor.execute('DELETE FROM files WHERE file_path = ?', (file_path,))
-                cursor.execute('DELETE FROM duplicate_groups WHERE file1_path = ? OR file2_path = ?', 
-                             (file_path, file_path))
+                cursor.executemany('DELETE FROM files WHERE file_path = ?', rows)
+                # Two equality deletes can each use an index, unlike a single OR
+                cursor.executemany('DELETE FROM duplicate_groups WHERE file1_path = ?', rows)
+                cursor.executemany('DELETE FROM duplicate_groups WHERE file2_path = ?', rows)
                 conn.commit()
         except Exception as e:
-            print(f"Error removing file {file_path}: {e}")
+            print(f"Error removing {len(file_paths)} files: {e}")
     
     def cleanup_missing_files(self):
         """Remove entries for files that no longer exist"""
         try:
-            files = self.get_all_files()
-            removed_count = 0
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT file_path FROM files')
+                file_paths = [row[0] for row in cursor.fetchall()]
             
-            for file_info in files:
-                file_path = file_info['file_path']
-                if not os.path.exists(file_path):
-                    self._remove_file(file_path)
-                    removed_count += 1
+            missing = [file_path for file_path in file_paths if not os.path.exists(file_path)]
+            self._remove_files(missing)
             
-            print(f"Cleaned up {removed_count} missing files from database")
+            print(f"Cleaned up {len(missing)} missing files from database")
             
         except Exception as e:
             print(f"Error during cleanup: {e}")
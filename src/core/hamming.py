@@ -0,0 +1,65 @@
+# src/core/hamming.py
+import numpy as np
+
+if hasattr(np, 'bitwise_count'):
+    def popcount(words: np.ndarray) -> np.ndarray:
+        """Count set bits of every element in a uint64 array"""
+        return np.bitwise_count(words)
+else:  # NumPy < 2.0
+    # Bits set in every 16-bit value; each uint64 then takes four table loads
+    _POPCOUNT_LUT8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+    _POPCOUNT_LUT16 = _POPCOUNT_LUT8[np.arange(1 << 16) & 0xFF] + _POPCOUNT_LUT8[np.arange(1 << 16) >> 8]
+    
+    def popcount(words: np.ndarray) -> np.ndarray:
+        """Count set bits of every element in a uint64 array"""
+        words = np.ascontiguousarray(words, dtype=np.uint64)
+        halves = _POPCOUNT_LUT16[words.view(np.uint16)].reshape(words.shape + (4,))
+        return halves.sum(axis=-1, dtype=np.uint8)
+
+
+def hamming_distances(query: np.ndarray, table: np.ndarray) -> np.ndarray:
+    """
+    Hamming distance between one packed hash and every row of a table
+    Args:
+        query: uint64 array of shape (words,)
+        table: uint64 array of shape (n, words)
+    Returns:
+        Array of n bit distances
+    """
+    return popcount(table ^ query).sum(axis=-1)
+
+
+def within_distance(query: np.ndarray, table: np.ndarray, max_distance: int) -> np.ndarray:
+    """
+    Mask of table rows within max_distance bits of one packed hash
+    Args:
+        query: uint64 array of shape (words,)
+        table: uint64 array of shape (n, words)
+    Returns:
+        Boolean array of length n
+    """
+    if not len(table):
+        return np.zeros(0, dtype=bool)
+    return hamming_distances(query, table) <= max_distance
+
+
+def pairwise_distances(table_a: np.ndarray, table_b: np.ndarray) -> np.ndarray:
+    """
+    Hamming distance between every row of two packed hash tables
+    Args:
+        table_a: uint64 array of shape (n, words)
+        table_b: uint64 array of shape (m, words)
+    Returns:
+        (n, m) matrix of bit distances
+    """
+    return popcount(table_a[:, None, :] ^ table_b[None, :, :]).sum(axis=-1)
+
+
+if hasattr(int, 'bit_count'):
+    def bit_distance(a: int, b: int) -> int:
+        """Hamming distance between two integer fingerprints"""
+        return (a ^ b).bit_count()
+else:  # Python < 3.10
+    def bit_distance(a: int, b: int) -> int:
+        """Hamming distance between two integer fingerprints"""
+        return bin(a ^ b).count('1')
@@ -0,0 +1,60 @@
+# src/core/hash_index.py
+from typing import Any, Callable, List, Tuple
+
+from .hamming import bit_distance
+
+
+class BKTree:
+    """Burkhard-Keller tree answering radius queries over integer fingerprints"""
+    
+    def __init__(self, distance: Callable[[int, int], int] = bit_distance):
+        self._distance = distance
+        self._root = None  # (key, values, {distance: child})
+        self._size = 0
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    def add(self, key: int, value: Any):
+        """Insert a value under its fingerprint; equal fingerprints share one node"""
+        self._size += 1
+        if self._root is None:
+            self._root = (key, [value], {})
+            return
+        
+        node = self._root
+        while True:
+            node_key, values, children = node
+            distance = self._distance(key, node_key)
+            if distance == 0:
+                values.append(value)
+                return
+            
+            child = children.get(distance)
+            if child is None:
+                children[distance] = (key, [value], {})
+                return
+            node = child
+    
+    def query(self, key: int, radius: int) -> List[Tuple[int, Any]]:
+        """
+        Find every value whose fingerprint is within radius of key
+        Returns: List of (distance, value) tuples
+        """
+        results = []
+        if self._root is None:
+            return results
+        
+        stack = [self._root]
+        while stack:
+            node_key, values, children = stack.pop()
+            distance = self._distance(key, node_key)
+            if distance <= radius:
+                results.extend((distance, value) for value in values)
+            
+            # Triangle inequality: matches can only sit in subtrees d - radius .. d + radius away
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        
+        return results
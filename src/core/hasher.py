@@ -1,15 +1,99 @@
 import cv2
 import numpy as np
-import imagehash
-from PIL import Image
-from typing import List, Tuple, Optional
-import hashlib
+from typing import List, Tuple, Optional, Callable, Dict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import base64
+import logging
+import struct
+
+from .hamming import hamming_distances, popcount
+from .hash_index import BKTree
+
+# PyAV seeks straight to keyframes; OpenCV is used when it is not installed
+try:
+    import av
+    AV_AVAILABLE = True
+except ImportError:
+    AV_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+# Packed video hash: frame count and meaningful bit count, followed by the
+# little-endian 64-bit words of every frame's dhash and phash
+_HASH_HEADER = struct.Struct('<II')
+
+
+if hasattr(int, 'bit_count'):
+    _bit_count = int.bit_count
+else:  # Python < 3.10
+    def _bit_count(value: int) -> int:
+        return bin(value).count('1')
+
+
+@lru_cache(maxsize=65536)
+def _unpack_video_hash(video_hash: str) -> Optional[Tuple[int, Tuple[int, ...], int]]:
+    """
+    Decode a packed video hash into (frame count, 64-bit frame hash words, meaningful bit count)
+    Returns None if the hash is malformed or in the old "count:md5:hex|..." text
+    format, whose frames were sampled and hashed differently.
+    """
+    try:
+        raw = base64.b64decode(video_hash, validate=True)
+        frame_count, total_bits = _HASH_HEADER.unpack_from(raw)
+        word_count = (len(raw) - _HASH_HEADER.size) // 8
+        words = struct.unpack_from(f'<{word_count}Q', raw, _HASH_HEADER.size)
+        
+        if frame_count <= 0 or not total_bits or total_bits > 64 * word_count:
+            return None
+        
+        return frame_count, words, total_bits
+        
+    except (AttributeError, TypeError, ValueError, struct.error):
+        return None
+
+
+@lru_cache(maxsize=8)
+def _dct_matrix(size: int) -> np.ndarray:
+    """Unnormalized DCT-II basis (same scaling as scipy.fftpack.dct)"""
+    n = np.arange(size)
+    return 2.0 * np.cos(np.pi * np.outer(n, 2 * n + 1) / (2 * size))
+
+
+def _bits_to_words(bits: np.ndarray) -> np.ndarray:
+    """
+    Pack each row of a boolean (n, bits) array, most significant bit first, into 64-bit words
+    Returns: (n, words) uint64 array; rows are zero padded to whole words
+    """
+    rows, width = bits.shape
+    padded = np.zeros((rows, -(-width // 64) * 64), dtype=bool)
+    padded[:, :width] = bits
+    return np.packbits(padded, axis=1).view('>u8').astype(np.uint64)
+
 
 class PerceptualHasher:
     """Fast perceptual hashing for video duplicate detection"""
     
-    def __init__(self, hash_size: int = 8):
+    # Weights of frame count and frame hash agreement in the similarity score
+    COUNT_WEIGHT = 0.3
+    HASH_WEIGHT = 0.7
+    
+    # Sample spacing, in frames, up to which reading forward beats seeking
+    MAX_GRAB_STRIDE = 30
+    
+    # Share of a frame's dhash bits that must be set for the frame to identify a video.
+    # Black or faded-in frames have a near-empty dhash, and their phash is DCT rounding noise.
+    MIN_TEXTURED_DHASH_FRACTION = 0.125
+    
+    def __init__(self, hash_size: int = 8, decode_workers: int = 2):
+        """
+        Args:
+            hash_size: Side of the dhash/phash bit grid
+            decode_workers: Readers decoding one video's sample frames concurrently
+        """
         self.hash_size = hash_size
+        self.decode_workers = max(1, decode_workers)
         
     def compute_video_hash(self, video_path: str) -> Optional[str]:
         """
@@ -17,108 +101,436 @@ class PerceptualHasher:
         Returns: Combined hash string or None if failed
         """
         try:
-            cap = cv2.VideoCapture(video_path)
-            if not cap.isOpened():
-                return None
+            frames = self._read_frames_av(video_path) if AV_AVAILABLE else None
+            if frames is None:
+                frames = self._read_frames_cv2(video_path)
             
-            # Get video properties
-            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            if frame_count == 0:
-                cap.release()
+            frame_words = self._compute_frame_words(frames)
+            if not len(frame_words):
                 return None
             
-            # Sample frames at regular intervals
-            sample_count = min(10, frame_count)
-            frame_hashes = []
+            # Combine frame hashes
+            return self._combine_hashes(frame_words)
             
-            for i in range(sample_count):
-                frame_pos = int((i / sample_count) * frame_count)
-                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_pos)
+        except Exception as e:
+            logger.error("Error computing hash for %s: %s", video_path, e)
+            return None
+    
+    def _split_samples(self, positions: List[int]) -> List[List[int]]:
+        """Split sample positions into contiguous runs, one per decode worker"""
+        workers = min(self.decode_workers, len(positions))
+        if workers <= 1:
+            return [positions]
+        
+        size = -(-len(positions) // workers)
+        return [positions[i:i + size] for i in range(0, len(positions), size)]
+    
+    def _read_chunks(self, read_chunk: Callable[[List[int]], List[np.ndarray]],
+                     chunks: List[List[int]]) -> List[np.ndarray]:
+        """
+        Decode chunks of sample positions on separate readers, keeping sample order
+        Decoders release the GIL, so seeks and decodes of different chunks overlap.
+        """
+        with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+            return [frame for frames in executor.map(read_chunk, chunks) for frame in frames]
+    
+    def _read_frames_cv2(self, video_path: str) -> List[np.ndarray]:
+        """Decode up to 10 evenly spaced frames with OpenCV"""
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            return []
+        
+        # Get video properties
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        
+        # Sample frames at regular intervals
+        sample_count = min(10, frame_count)
+        positions = [int((i / sample_count) * frame_count) for i in range(sample_count)]
+        
+        if sample_count and frame_count / sample_count <= self.MAX_GRAB_STRIDE:
+            return self._grab_positions_cv2(cap, positions)
+        
+        if fps > 0:
+            # Millisecond seeks use the demuxer's keyframe seek, while frame
+            # index seeks often decode forward from the last keyframe
+            seek_prop = cv2.CAP_PROP_POS_MSEC
+            positions = [frame_pos * 1000.0 / fps for frame_pos in positions]
+        else:
+            seek_prop = cv2.CAP_PROP_POS_FRAMES
+        
+        chunks = self._split_samples(positions)
+        if len(chunks) == 1:
+            return self._read_positions_cv2(video_path, positions, seek_prop, cap)
+        
+        cap.release()
+        return self._read_chunks(
+            lambda chunk: self._read_positions_cv2(video_path, chunk, seek_prop), chunks)
+    
+    def _grab_positions_cv2(self, cap: cv2.VideoCapture, positions: List[int]) -> List[np.ndarray]:
+        """
+        Walk a short clip forward, retrieving only the frames at the given indices
+        grab() advances without the color conversion read() does, and no seek is issued.
+        """
+        frames = []
+        try:
+            frame_pos = 0
+            for position in positions:
+                while frame_pos < position:
+                    if not cap.grab():
+                        return frames
+                    frame_pos += 1
+                
+                if not cap.grab():
+                    return frames
+                frame_pos += 1
+                
+                ret, frame = cap.retrieve()
+                if ret:
+                    frames.append(frame)
+        finally:
+            cap.release()
+        
+        return frames
+    
+    def _read_positions_cv2(self, video_path: str, positions: List[float], seek_prop: int,
+                            cap: Optional[cv2.VideoCapture] = None) -> List[np.ndarray]:
+        """
+        Read one frame at each position, opening a capture unless one is passed in
+        Args:
+            seek_prop: cv2.CAP_PROP_POS_MSEC or cv2.CAP_PROP_POS_FRAMES, the unit of positions
+        """
+        if cap is None:
+            cap = cv2.VideoCapture(video_path)
+        
+        frames = []
+        try:
+            for position in positions:
+                cap.set(seek_prop, position)
                 
                 ret, frame = cap.read()
                 if ret:
-                    frame_hash = self._compute_frame_hash(frame)
-                    if frame_hash:
-                        frame_hashes.append(frame_hash)
-            
+                    frames.append(frame)
+        finally:
             cap.release()
+        
+        return frames
+    
+    def _read_frames_av(self, video_path: str) -> Optional[List[np.ndarray]]:
+        """
+        Decode up to 10 evenly spaced frames with PyAV
+        Each sample seeks to the preceding keyframe and decodes forward to the
+        target, instead of OpenCV re-decoding from its current position.
+        Returns: List of grayscale frames already at hash size, or None to fall back to OpenCV
+        """
+        try:
+            container = av.open(video_path)
+            try:
+                if not container.streams.video:
+                    return None
+                
+                stream = container.streams.video[0]
+                if stream.time_base is None or not stream.average_rate:
+                    return None
+                
+                if stream.duration:
+                    duration = float(stream.duration * stream.time_base)
+                elif container.duration:
+                    duration = container.duration / av.time_base
+                else:
+                    return None
+                
+                frame_count = stream.frames or round(duration * stream.average_rate)
+                if frame_count <= 0:
+                    return None
+                
+                start = stream.start_time or 0
+                sample_count = min(10, frame_count)
+                targets = [start + int((i / sample_count) * duration / stream.time_base)
+                           for i in range(sample_count)]
+                
+                chunks = self._split_samples(targets)
+                if len(chunks) == 1:
+                    return self._read_targets_av(video_path, targets, container)
+            finally:
+                container.close()
             
-            if not frame_hashes:
-                return None
-            
-            # Combine frame hashes
-            return self._combine_hashes(frame_hashes)
+            return self._read_chunks(lambda chunk: self._read_targets_av(video_path, chunk), chunks)
             
-        except Exception as e:
-            print(f"Error computing hash for {video_path}: {e}")
+        except Exception:
             return None
     
-    def _compute_frame_hash(self, frame: np.ndarray) -> Optional[str]:
-        """Compute hash for a single frame"""
+    def _read_targets_av(self, video_path: str, targets: List[int],
+                         container=None) -> List[np.ndarray]:
+        """Decode the first frame at or after each pts target, opening a container unless one is passed in"""
+        if container is None:
+            container = av.open(video_path)
+        
+        frames = []
         try:
-            # Convert to PIL Image for imagehash
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            pil_image = Image.fromarray(frame_rgb)
-            
-            # Compute multiple hash types for robustness
-            dhash = str(imagehash.dhash(pil_image, hash_size=self.hash_size))
-            phash = str(imagehash.phash(pil_image, hash_size=self.hash_size))
-            
-            return f"{dhash}:{phash}"
+            stream = container.streams.video[0]
+            for target in targets:
+                container.seek(target, stream=stream, backward=True, any_frame=False)
+                
+                for frame in container.decode(stream):
+                    if frame.pts is not None and frame.pts >= target:
+                        # Only luma at hash_size*4 pixels is hashed; swscale converts
+                        # and area-downscales in one pass, so no full-size frame is copied
+                        side = self.hash_size * 4
+                        small = frame.reformat(width=side, height=side, format='gray',
+                                               interpolation='AREA')
+                        frames.append(small.to_ndarray())
+                        break
+        finally:
+            container.close()
+        
+        return frames
+    
+    def _compute_frame_words(self, frames: List[np.ndarray]) -> np.ndarray:
+        """
+        Compute hashes for a video's sampled frames, skipping frames that fail
+        Returns: (frames, words) uint64 array, each row the frame's dhash words then phash words
+        """
+        smalls = []
+        for frame in frames:
+            small = self._shrink_frame(frame)
+            if small is not None:
+                smalls.append(small)
+        
+        if not smalls:
+            return np.empty((0, 0), dtype=np.uint64)
+        
+        # Compute multiple hash types for robustness on one stack of all frames
+        stack = np.stack(smalls)
+        return np.hstack([_bits_to_words(self._dhash(stack)), _bits_to_words(self._phash(stack))])
+    
+    def _shrink_frame(self, frame: np.ndarray) -> Optional[np.ndarray]:
+        """Reduce a BGR or grayscale frame to the hash_size*4 square gray image both hashes use"""
+        try:
+            # Both hashes only look at luma at most hash_size*4 pixels wide (phash),
+            # so shrink a single grayscale channel once and hash it directly
+            side = self.hash_size * 4
+            gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            return cv2.resize(gray, (side, side), interpolation=cv2.INTER_AREA)
             
         except Exception:
             return None
     
-    def _combine_hashes(self, frame_hashes: List[str]) -> str:
-        """Combine multiple frame hashes into single video hash"""
-        combined = "|".join(frame_hashes)
-        # Create a shorter representative hash
-        md5_hash = hashlib.md5(combined.encode()).hexdigest()
-        return f"{len(frame_hashes)}:{md5_hash}:{combined[:100]}"
+    def _dhash(self, grays: np.ndarray) -> np.ndarray:
+        """
+        Difference hash: sign of horizontal gradients on a (hash_size+1) x hash_size image
+        Args:
+            grays: (frames, side, side) stack, resized in one call as a tall image;
+            side is a multiple of hash_size so no output row mixes two frames
+        Returns: (frames, hash_size**2) boolean array of hash bits
+        """
+        frames, side = len(grays), grays.shape[-1]
+        tall = grays.reshape(frames * side, side)
+        pixels = cv2.resize(tall, (self.hash_size + 1, frames * self.hash_size),
+                            interpolation=cv2.INTER_AREA)
+        pixels = pixels.reshape(frames, self.hash_size, self.hash_size + 1)
+        return (pixels[:, :, 1:] > pixels[:, :, :-1]).reshape(frames, -1)
+    
+    def _phash(self, grays: np.ndarray) -> np.ndarray:
+        """
+        Perceptual hash: low-frequency 2D DCT coefficients compared to their median
+        Args:
+            grays: (frames, side, side) stack; the DCT of every frame is one batched matmul
+        Returns: (frames, hash_size**2) boolean array of hash bits
+        """
+        basis = _dct_matrix(grays.shape[-1])
+        dct = basis @ grays.astype(np.float64) @ basis.T
+        low_freq = dct[:, :self.hash_size, :self.hash_size].reshape(len(grays), -1)
+        return low_freq > np.median(low_freq, axis=1, keepdims=True)
     
-    def compute_similarity(self, hash1: str, hash2: str) -> float:
+    def textured_frames(self, frame_words: np.ndarray) -> np.ndarray:
+        """
+        Which frames carry enough detail to tell videos apart
+        Args:
+            frame_words: (..., frames, words per frame) uint64 array, dhash words then phash words
+        Returns: Boolean array of shape (..., frames)
+        """
+        dhash_words = frame_words.shape[-1] // 2
+        dhash_bits = popcount(frame_words[..., :dhash_words]).sum(axis=-1)
+        return dhash_bits >= self.MIN_TEXTURED_DHASH_FRACTION * dhash_words * 64
+    
+    def _combine_hashes(self, frame_words: np.ndarray) -> str:
+        """Combine per-frame hash words into single video hash"""
+        frame_count = len(frame_words)
+        total_bits = frame_count * 2 * self.hash_size ** 2
+        
+        # Fixed-width binary record, base64 encoded to fit the text hash column
+        packed = (_HASH_HEADER.pack(frame_count, total_bits) +
+                  frame_words.astype('<u8').tobytes())
+        return base64.b64encode(packed).decode('ascii')
+    
+    def compute_similarity(self, hash1: str, hash2: str, min_similarity: float = 0.0) -> float:
         """
         Compute similarity between two video hashes
+        Args:
+            min_similarity: Pairs that provably score below this return 0.0 early
         Returns: Similarity score 0.0-1.0 (higher = more similar)
         """
         if not hash1 or not hash2:
             return 0.0
         
-        try:
-            # Parse hash components
-            parts1 = hash1.split(':', 2)
-            parts2 = hash2.split(':', 2)
-            
-            if len(parts1) < 3 or len(parts2) < 3:
-                return 0.0
-            
-            frame_count1 = int(parts1[0])
-            frame_count2 = int(parts2[0])
-            
-            # Frame count similarity
-            count_similarity = min(frame_count1, frame_count2) / max(frame_count1, frame_count2)
-            
-            # Hash similarity
-            hash_similarity = self._compare_hash_strings(parts1[2], parts2[2])
+        unpacked1 = _unpack_video_hash(hash1)
+        unpacked2 = _unpack_video_hash(hash2)
+        if unpacked1 is None or unpacked2 is None:
+            return 0.0
+        
+        frame_count1, words1, total_bits1 = unpacked1
+        frame_count2, words2, total_bits2 = unpacked2
+        
+        # Frame count similarity
+        count_similarity = min(frame_count1, frame_count2) / max(frame_count1, frame_count2)
+        
+        # Even identical frame hashes cannot lift this pair over the threshold
+        count_score = count_similarity * self.COUNT_WEIGHT
+        if count_score + self.HASH_WEIGHT < min_similarity:
+            return 0.0
+        
+        # Hash similarity over the frames both hashes cover
+        min_hash_similarity = (min_similarity - count_score) / self.HASH_WEIGHT
+        hash_similarity = self._compare_hash_words(words1, words2, min(total_bits1, total_bits2),
+                                                   min_hash_similarity)
+        
+        # Combined score
+        return count_score + (hash_similarity * self.HASH_WEIGHT)
+    
+    def is_valid_hash(self, video_hash: str) -> bool:
+        """Whether a stored hash is in the current packed format and can be compared"""
+        return bool(video_hash) and _unpack_video_hash(video_hash) is not None
+    
+    def hash_to_words(self, video_hash: str) -> Optional[Tuple[int, np.ndarray, int]]:
+        """
+        Unpack a video hash for vectorized comparison
+        Returns: (frame count, uint64 frame hash words, meaningful bit count) or None if malformed
+        """
+        unpacked = _unpack_video_hash(video_hash)
+        if unpacked is None:
+            return None
+        
+        frame_count, words, total_bits = unpacked
+        return frame_count, np.array(words, dtype=np.uint64), total_bits
+    
+    def compare_many(self, query_hash: str, hashes: List[str]) -> np.ndarray:
+        """
+        Compute similarity between one video hash and many others
+        Hashes with the query's layout are scored together with one XOR and
+        popcount over a packed uint64 table; the rest use compute_similarity.
+        Returns: Array of similarity scores, 0.0 for malformed hashes
+        """
+        similarities = np.zeros(len(hashes), dtype=np.float64)
+        query = _unpack_video_hash(query_hash) if query_hash else None
+        if query is None:
+            return similarities
+        
+        query_count, query_words, query_bits = query
+        indices, counts, rows = [], [], []
+        for i, video_hash in enumerate(hashes):
+            unpacked = _unpack_video_hash(video_hash) if video_hash else None
+            if unpacked is None:
+                continue
             
-            # Combined score
-            return (count_similarity * 0.3) + (hash_similarity * 0.7)
+            frame_count, words, total_bits = unpacked
+            if total_bits == query_bits and len(words) == len(query_words):
+                indices.append(i)
+                counts.append(frame_count)
+                rows.append(words)
+            else:
+                similarities[i] = self.compute_similarity(query_hash, video_hash)
+        
+        if rows:
+            table = np.array(rows, dtype=np.uint64)
+            distances = hamming_distances(np.array(query_words, dtype=np.uint64), table)
             
-        except Exception:
-            return 0.0
+            counts = np.array(counts, dtype=np.float64)
+            count_similarity = np.minimum(counts, query_count) / np.maximum(counts, query_count)
+            hash_similarity = np.maximum(0.0, 1.0 - distances / query_bits)
+            similarities[indices] = (count_similarity * self.COUNT_WEIGHT +
+                                     hash_similarity * self.HASH_WEIGHT)
+        
+        return similarities
+    
+    def match_many(self, query_hash: str, hashes: List[str], min_similarity: float = 0.8) -> np.ndarray:
+        """
+        Mask of hashes whose similarity to the query reaches min_similarity
+        Returns: Boolean array, False for malformed hashes
+        """
+        if not hashes:
+            return np.zeros(0, dtype=bool)
+        return self.compare_many(query_hash, hashes) >= min_similarity
     
-    def _compare_hash_strings(self, hash_str1: str, hash_str2: str) -> float:
-        """Compare hash strings using Hamming distance"""
-        if len(hash_str1) != len(hash_str2):
-            min_len = min(len(hash_str1), len(hash_str2))
-            hash_str1 = hash_str1[:min_len]
-            hash_str2 = hash_str2[:min_len]
+    def fingerprint(self, video_hash: str) -> Optional[int]:
+        """
+        Key frame's dhash and phash words as one integer, for Hamming indexing
+        The key frame is the first textured frame, as textured_frames decides for
+        the comparator's LSH bands, so black or faded intros do not key every
+        video alike. Flat videos fall back to their first frame.
+        Returns: None if the hash is malformed
+        """
+        unpacked = self.hash_to_words(video_hash) if video_hash else None
+        if unpacked is None:
+            return None
+        
+        frame_count, words, _ = unpacked
+        words_per_frame = len(words) // frame_count
+        if not words_per_frame:
+            return None
         
-        if not hash_str1:
+        frames = words[:frame_count * words_per_frame].reshape(frame_count, words_per_frame)
+        textured = np.flatnonzero(self.textured_frames(frames))
+        
+        key = 0
+        for word in frames[textured[0] if len(textured) else 0]:
+            key = (key << 64) | int(word)
+        return key
+    
+    def build_index(self, file_hashes: Dict[str, str]) -> BKTree:
+        """
+        Index video hashes by key frame fingerprint, for single-file lookups
+        Directory scans do not use this index; EfficientComparator finds
+        duplicates across a whole table with LSH bands over every textured frame.
+        Args:
+            file_hashes: Dict mapping file paths to their hashes
+        Returns: BKTree whose values are file paths
+        """
+        index = BKTree()
+        for file_path, file_hash in file_hashes.items():
+            key = self.fingerprint(file_hash)
+            if key is not None:
+                index.add(key, file_path)
+        return index
+    
+    def query_index(self, index: BKTree, video_hash: str, radius: int = 8) -> List[str]:
+        """
+        Find candidate files whose key frame fingerprint is within radius bits
+        Candidates still need compute_similarity for a final score.
+        """
+        key = self.fingerprint(video_hash)
+        if key is None:
+            return []
+        return [file_path for _, file_path in index.query(key, radius)]
+    
+    def _compare_hash_words(self, words1: Tuple[int, ...], words2: Tuple[int, ...],
+                            total_bits: int, min_similarity: float = 0.0) -> float:
+        """
+        Compare frame hash words using bit-level Hamming distance
+        Only the words both hashes have are compared. Stops early and returns 0.0
+        once the distance rules out min_similarity.
+        """
+        if not words1 or not words2 or not total_bits:
             return 0.0
         
-        # Hamming distance
-        differences = sum(c1 != c2 for c1, c2 in zip(hash_str1, hash_str2))
-        similarity = 1.0 - (differences / len(hash_str1))
+        # Hamming distance; a handful of words is cheaper as Python ints than as arrays
+        max_differences = (1.0 - min_similarity) * total_bits
+        differences = 0
+        for w1, w2 in zip(words1, words2):
+            differences += _bit_count(w1 ^ w2)
+            if differences > max_differences:
+                return 0.0
+        
+        similarity = 1.0 - (differences / total_bits)
         
         return max(0.0, similarity)
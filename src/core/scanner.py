@@ -1,31 +1,67 @@
 # src/core/scanner.py
 import os
-import sqlite3
-from pathlib import Path
 from typing import List, Tuple, Dict, Callable, Optional
-import hashlib
-import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from collections import defaultdict
 from datetime import datetime
-import threading
+import hashlib
+import logging
+import multiprocessing
+import time
 
 from .hasher import PerceptualHasher
 from .comparator import EfficientComparator
 from .database import VideoDatabase
 
+logger = logging.getLogger(__name__)
+
+
+# Hasher owned by each worker process, set once by _init_hash_worker
+_worker_hasher: PerceptualHasher = None
+
+
+def _init_hash_worker(hash_size: int):
+    """Create the worker's hasher; videos are already spread across processes,
+    so each one decodes its samples on a single reader"""
+    global _worker_hasher
+    _worker_hasher = PerceptualHasher(hash_size, decode_workers=1)
+
+
+def _hash_video_worker(file_path: str) -> Optional[str]:
+    """Compute a video hash inside a worker process"""
+    return _worker_hasher.compute_video_hash(file_path)
+
+
 class VideoScanner:
     """Main scanner class for efficient video duplicate detection"""
     
-    SUPPORTED_FORMATS = {'.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm', '.m4v', '.3gp'}
+    SUPPORTED_FORMATS = frozenset({'.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm', '.m4v', '.3gp'})
+    
+    # Newly computed hashes written to the database per transaction
+    STORE_BATCH_SIZE = 100
+    
+    # Leading bytes compared when files of equal size are checked for identical content
+    HEAD_BYTES = 1 << 20
+    
+    # Larger size groups are first narrowed on a digest of their first HEAD_BYTES
+    FULL_DIGEST_MAX_FILES = 8
+    
+    # Progress is reported after this many files or seconds, whichever comes first
+    PROGRESS_FILES = 32
+    PROGRESS_INTERVAL = 0.25
     
     def __init__(self, similarity_threshold: float = 0.8, 
                  progress_callback: Optional[Callable[[int, int], None]] = None,
-                 db_path: str = "video_duplicates.db"):
+                 db_path: str = "video_duplicates.db", num_workers: Optional[int] = None):
         self.similarity_threshold = similarity_threshold
+        self.num_workers = num_workers or os.cpu_count() or 1
         self.progress_callback = progress_callback
         self.hasher = PerceptualHasher()
         self.comparator = EfficientComparator(similarity_threshold)
         self.database = VideoDatabase(db_path)
         self._stop_requested = False
+        self._progress_reported = 0
+        self._progress_time = 0.0
         
     def scan_directory(self, directory: str, use_cache: bool = True) -> List[Tuple[str, str, float]]:
         """
@@ -65,58 +101,247 @@ class VideoScanner:
     def _find_video_files(self, directory: str) -> List[str]:
         """Find all video files in directory recursively"""
         video_files = []
+        pending = [directory]
         
-        for root, dirs, files in os.walk(directory):
-            for file in files:
-                if Path(file).suffix.lower() in self.SUPPORTED_FORMATS:
-                    full_path = os.path.join(root, file)
-                    video_files.append(full_path)
+        # Bound once; the inner loop runs for every entry in the tree
+        suffixes = self.SUPPORTED_FORMATS
+        add_video = video_files.append
+        add_dir = pending.append
+        
+        # scandir reports entry types from the directory listing itself, so no
+        # per-file stat or Path object is needed to filter by extension
+        while pending:
+            try:
+                with os.scandir(pending.pop()) as entries:
+                    for entry in entries:
+                        # Like os.walk, list symlinked files but do not descend into symlinked dirs
+                        if entry.is_dir():
+                            if not entry.is_symlink():
+                                add_dir(entry.path)
+                            continue
+                        
+                        name = entry.name
+                        dot = name.rfind('.')
+                        if dot > 0 and name[dot:].lower() in suffixes:
+                            add_video(entry.path)
+            except OSError:
+                # Unreadable directories are skipped, as os.walk does
+                continue
         
         return video_files
     
+    def _find_identical_files(self, video_files: List[str]) -> Dict[str, List[str]]:
+        """
+        Find files with identical content without decoding them
+        Only files sharing a size are read, and files are only grouped on
+        full-content digests. Large size groups are first narrowed on their
+        first HEAD_BYTES so files that differ early are never read in full.
+        Returns: Dict mapping one representative file to its identical copies
+        """
+        by_size = defaultdict(list)
+        for file_path in video_files:
+            try:
+                by_size[os.stat(file_path).st_size].append(file_path)
+            except OSError:
+                continue
+        
+        identical = {}
+        size_groups = [same_size for same_size in by_size.values() if len(same_size) > 1]
+        if not size_groups:
+            return identical
+        
+        # Reading is I/O bound and hashlib releases the GIL, so threads suffice;
+        # one bounded pool serves every size group so large groups cannot flood the disk
+        with ThreadPoolExecutor(max_workers=self.num_workers * 2) as executor:
+            for same_size in size_groups:
+                candidates = [same_size]
+                if len(same_size) > self.FULL_DIGEST_MAX_FILES:
+                    candidates = self._group_by_digest(executor, same_size, full=False)
+                
+                for candidate in candidates:
+                    for group in self._group_by_digest(executor, candidate, full=True):
+                        identical[group[0]] = group[1:]
+        
+        return identical
+    
+    def _group_by_digest(self, executor: ThreadPoolExecutor, file_paths: List[str],
+                         full: bool) -> List[List[str]]:
+        """Groups of two or more files sharing a digest; unreadable files are dropped"""
+        digests = executor.map(lambda file_path: self._file_digest(file_path, full), file_paths)
+        
+        by_digest = defaultdict(list)
+        for file_path, digest in zip(file_paths, digests):
+            if digest is not None:
+                by_digest[digest].append(file_path)
+        
+        return [group for group in by_digest.values() if len(group) > 1]
+    
+    def _file_digest(self, file_path: str, full: bool) -> Optional[bytes]:
+        """SHA-256 of a file's full content, or of its first HEAD_BYTES"""
+        try:
+            with open(file_path, 'rb') as f:
+                if not full:
+                    return hashlib.sha256(f.read(self.HEAD_BYTES)).digest()
+                
+                if hasattr(hashlib, 'file_digest'):
+                    return hashlib.file_digest(f, 'sha256').digest()
+                
+                # Python < 3.11
+                digest = hashlib.sha256()
+                for chunk in iter(lambda: f.read(self.HEAD_BYTES), b''):
+                    digest.update(chunk)
+                return digest.digest()
+                
+        except OSError:
+            return None
+    
     def _process_files(self, video_files: List[str], use_cache: bool) -> Dict[str, str]:
         """Process video files and compute hashes"""
         file_hashes = {}
         total_files = len(video_files)
         processed = 0
+        to_hash = []
+        self._progress_reported = 0
+        self._progress_time = time.monotonic()
+        
+        # One query fetches every cached entry; validity is checked per file below
+        cached = self.database.get_file_hashes_bulk(video_files) if use_cache else {}
+        stale = []
         
+        # Cache hits are resolved here; the rest are hashed afterwards in parallel
         for file_path in video_files:
             if self._stop_requested:
-                break
+                return file_hashes
                 
             try:
+                # Stat once; the result serves both the cache check and the metadata
+                file_stat = os.stat(file_path)
+                
                 # Check cache first
                 cached_hash = None
-                if use_cache:
-                    cached_hash = self.database.get_file_hash(file_path)
+                entry = cached.get(file_path)
+                if entry:
+                    stored_hash, stored_modified, stored_size = entry
+                    current_modified = datetime.fromtimestamp(file_stat.st_mtime).isoformat()
+                    if (stored_modified == current_modified and stored_size == file_stat.st_size
+                            and self.hasher.is_valid_hash(stored_hash)):
+                        cached_hash = stored_hash
+                    else:
+                        # File was modified or hashed by an older version, drop the old entry
+                        stale.append(file_path)
                 
                 if cached_hash:
                     file_hashes[file_path] = cached_hash
                 else:
-                    # Compute new hash
-                    file_hash = self.hasher.compute_video_hash(file_path)
-                    if file_hash:
-                        file_hashes[file_path] = file_hash
-                        
-                        # Store in database
-                        file_info = self._get_file_info(file_path)
-                        self.database.store_file_hash(file_path, file_hash, file_info)
-                
-                processed += 1
-                if self.progress_callback:
-                    self.progress_callback(processed, total_files)
+                    to_hash.append((file_path, file_stat))
+                    continue
                     
             except Exception as e:
                 print(f"Error processing {file_path}: {e}")
+            
+            processed += 1
+            self._report_progress(processed, total_files)
+        
+        self.database.remove_files(stale)
+        
+        # Byte-identical copies among the uncached files are decoded once, through one
+        # representative; cached files are never read, so a rescan only stats them
+        identical = self._find_identical_files([file_path for file_path, _ in to_hash])
+        copies = {copy for group in identical.values() for copy in group}
+        
+        # New hashes are written in batches rather than one transaction per file
+        pending = []
+        for file_path, file_stat, file_hash in self._compute_hashes(
+                [(file_path, file_stat) for file_path, file_stat in to_hash if file_path not in copies]):
+            if file_hash:
+                file_hashes[file_path] = file_hash
+                pending.append((file_path, file_hash, self._get_file_info(file_path, file_stat)))
+                
+                if len(pending) >= self.STORE_BATCH_SIZE:
+                    self.database.store_many_file_hashes(pending)
+                    pending = []
+            
+            processed += 1
+            self._report_progress(processed, total_files)
+        
+        if self._stop_requested:
+            return file_hashes
+        
+        # Copies get rows of their own, so each can hold a thumbnail
+        for file_path, group in identical.items():
+            file_hash = file_hashes.get(file_path)
+            for copy in group:
+                if file_hash:
+                    file_hashes[copy] = file_hash
+                    pending.append((copy, file_hash, self._get_file_info(copy)))
                 processed += 1
-                continue
+            self._report_progress(processed, total_files)
+        
+        # Store in database
+        self.database.store_many_file_hashes(pending)
         
         return file_hashes
     
-    def _get_file_info(self, file_path: str) -> Dict:
-        """Get file metadata"""
+    def _report_progress(self, processed: int, total: int):
+        """
+        Forward progress to the callback in batches
+        Callbacks usually hop to a GUI thread, so they fire every PROGRESS_FILES
+        files or PROGRESS_INTERVAL seconds, and always for the last file.
+        """
+        if not self.progress_callback:
+            return
+        
+        now = time.monotonic()
+        if (processed < total and processed - self._progress_reported < self.PROGRESS_FILES
+                and now - self._progress_time < self.PROGRESS_INTERVAL):
+            return
+        
+        self._progress_reported = processed
+        self._progress_time = now
+        self.progress_callback(processed, total)
+    
+    def _compute_hashes(self, to_hash: List[Tuple[str, os.stat_result]]):
+        """
+        Compute hashes for uncached files, spreading decoding across processes
+        Yields: (file_path, file_stat, file_hash or None) as each file finishes
+        """
+        num_workers = min(self.num_workers, len(to_hash))
+        if num_workers < 2:
+            for file_path, file_stat in to_hash:
+                if self._stop_requested:
+                    return
+                yield file_path, file_stat, self.hasher.compute_video_hash(file_path)
+            return
+        
+        # Workers are spawned rather than forked: scans run on a GUI thread, and a
+        # forked child would inherit locks held by the parent's other threads
+        executor = ProcessPoolExecutor(max_workers=num_workers, initializer=_init_hash_worker,
+                                       initargs=(self.hasher.hash_size,),
+                                       mp_context=multiprocessing.get_context("spawn"))
         try:
-            stat = os.stat(file_path)
+            futures = {executor.submit(_hash_video_worker, file_path): (file_path, file_stat)
+                       for file_path, file_stat in to_hash}
+            
+            for future in as_completed(futures):
+                if self._stop_requested:
+                    return
+                
+                file_path, file_stat = futures[future]
+                try:
+                    file_hash = future.result()
+                except Exception as e:
+                    logger.error("Error processing %s: %s", file_path, e)
+                    file_hash = None
+                yield file_path, file_stat, file_hash
+        finally:
+            # Pending files are dropped when a stop is requested
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    def _get_file_info(self, file_path: str, stat: Optional[os.stat_result] = None) -> Dict:
+        """Get file metadata, reusing a stat result when the caller has one"""
+        try:
+            if stat is None:
+                stat = os.stat(file_path)
             return {
                 'size': stat.st_size,
                 'modified': datetime.fromtimestamp(stat.st_mtime).isoformat(),
@@ -146,6 +371,10 @@ class VideoScanner:
         """Request scan to stop"""
         self._stop_requested = True
     
+    def close(self):
+        """Release the database connection"""
+        self.database.close()
+    
     def get_file_thumbnail(self, file_path: str) -> Optional[str]:
         """Get thumbnail path for a video file"""
         return self.database.get_file_thumbnail(file_path)
@@ -156,19 +385,19 @@ class VideoScanner:
         from .thumbnail import ThumbnailGenerator
         
         generator = ThumbnailGenerator()
-        total = len(file_paths)
         
-        for i, file_path in enumerate(file_paths):
-            if self._stop_requested:
-                break
-                
-            try:
-                thumbnail_path = generator.generate_thumbnail(file_path)
+        try:
+            # Videos with identical hashes get one decoded thumbnail between them
+            video_hashes = {file_path: entry[0] for file_path, entry
+                            in self.database.get_file_hashes_bulk(file_paths).items()}
+            
+            thumbnails = generator.generate_many(file_paths, self.num_workers, progress_callback,
+                                                 should_stop=lambda: self._stop_requested,
+                                                 video_hashes=video_hashes)
+            
+            for file_path, thumbnail_path in thumbnails.items():
                 if thumbnail_path:
                     self.database.store_file_thumbnail(file_path, thumbnail_path)
                     
-                if progress_callback:
-                    progress_callback(i + 1, total)
-                    
-            except Exception as e:
-                print(f"Error generating thumbnail for {file_path}: {e}")
+        except Exception as e:
+            print(f"Error generating thumbnails: {e}")
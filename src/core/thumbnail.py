@@ -2,12 +2,59 @@
 import cv2
 import os
 from pathlib import Path
-from typing import Optional
+from typing import Optional, List, Dict, Callable
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
 import hashlib
+import logging
+import multiprocessing
+import shutil
+
+import numpy as np
+
+# PyAV seeks straight to a keyframe near the target; OpenCV is used when it is not installed
+try:
+    import av
+    AV_AVAILABLE = True
+except ImportError:
+    AV_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=65536)
+def _thumbnail_filename(video_path: str) -> str:
+    """Thumbnail file name derived from the video path"""
+    return f"{hashlib.blake2b(video_path.encode(), digest_size=16).hexdigest()}.jpg"
+
+
+# Generator owned by each worker process, set once by _init_thumbnail_worker
+_worker_generator: 'ThumbnailGenerator' = None
+
+
+def _init_thumbnail_worker(thumbnail_dir: str, size: tuple):
+    """Create the worker's generator"""
+    global _worker_generator
+    # Thumbnails are tiny; OpenCV's internal thread pool costs more than it saves,
+    # and the pool already keeps every core busy
+    cv2.setNumThreads(1)
+    _worker_generator = ThumbnailGenerator(thumbnail_dir, size)
+
+
+def _generate_thumbnail_worker(video_path: str, thumbnail_path: str) -> Optional[str]:
+    """Generate one thumbnail inside a worker process"""
+    return _worker_generator.generate_thumbnail(video_path, thumbnail_path)
+
 
 class ThumbnailGenerator:
     """Generate thumbnails for video files"""
     
+    # Quality 82 is visually indistinguishable at thumbnail size and about half the bytes of the default 95
+    JPEG_PARAMS = [cv2.IMWRITE_JPEG_QUALITY, 82, cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+    
+    # Frames within this factor of the thumbnail size are saved without resizing
+    RESIZE_TOLERANCE = 1.1
+    
     def __init__(self, thumbnail_dir: str = "thumbnails", size: tuple = (160, 120)):
         self.thumbnail_dir = thumbnail_dir
         self.size = size
@@ -15,83 +62,284 @@ class ThumbnailGenerator:
         # Create thumbnail directory if it doesn't exist
         Path(self.thumbnail_dir).mkdir(exist_ok=True)
     
-    def generate_thumbnail(self, video_path: str) -> Optional[str]:
+    def generate_thumbnail(self, video_path: str, thumbnail_path: Optional[str] = None) -> Optional[str]:
         """
         Generate thumbnail for a video file
         Args:
             video_path: Path to video file
+            thumbnail_path: Result of get_thumbnail_path, if the caller already has it
         Returns:
             Path to generated thumbnail or None if failed
         """
         try:
             # Create unique thumbnail filename based on video path
-            video_hash = hashlib.md5(video_path.encode()).hexdigest()
-            thumbnail_filename = f"{video_hash}.jpg"
-            thumbnail_path = os.path.join(self.thumbnail_dir, thumbnail_filename)
+            if thumbnail_path is None:
+                thumbnail_path = self.get_thumbnail_path(video_path)
             
             # Skip if thumbnail already exists
             if os.path.exists(thumbnail_path):
                 return thumbnail_path
             
-            # Open video file
-            cap = cv2.VideoCapture(video_path)
-            if not cap.isOpened():
-                return None
-            
-            # Get frame from 10% into the video (avoid black intro frames)
-            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            if frame_count > 0:
-                target_frame = max(1, int(frame_count * 0.1))
-                cap.set(cv2.CAP_PROP_POS_FRAMES, target_frame)
-            
-            # Read frame
-            ret, frame = cap.read()
-            cap.release()
-            
-            if not ret or frame is None:
+            thumbnail = self._read_thumbnail_av(video_path) if AV_AVAILABLE else None
+            if thumbnail is None:
+                thumbnail = self._read_thumbnail_cv2(video_path)
+            if thumbnail is None:
                 return None
             
-            # Resize frame to thumbnail size
-            thumbnail = cv2.resize(frame, self.size)
-            
             # Save thumbnail
-            success = cv2.imwrite(thumbnail_path, thumbnail)
-            
-            if success:
+            if self._write_thumbnail(thumbnail_path, thumbnail):
                 return thumbnail_path
             else:
                 return None
                 
         except Exception as e:
-            print(f"Error generating thumbnail for {video_path}: {e}")
+            logger.error("Error generating thumbnail for %s: %s", video_path, e)
             return None
     
+    def _write_thumbnail(self, thumbnail_path: str, thumbnail: np.ndarray) -> bool:
+        """
+        Encode in memory and move the file into place atomically, so a crash or a
+        concurrent writer never leaves a truncated JPEG at thumbnail_path
+        """
+        success, buffer = cv2.imencode('.jpg', thumbnail, self.JPEG_PARAMS)
+        if not success:
+            return False
+        
+        temp_path = f"{thumbnail_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(buffer)
+            os.replace(temp_path, thumbnail_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+        
+        return True
+    
+    def _read_thumbnail_cv2(self, video_path: str) -> Optional[np.ndarray]:
+        """Read the thumbnail frame with OpenCV, resized to thumbnail size"""
+        # Open video file
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            return None
+        
+        # Get frame from 10% into the video (avoid black intro frames)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if frame_count > 0:
+            target_frame = max(1, int(frame_count * 0.1))
+            cap.set(cv2.CAP_PROP_POS_FRAMES, target_frame)
+        
+        # Read frame
+        ret, frame = cap.read()
+        cap.release()
+        
+        if not ret or frame is None:
+            return None
+        
+        # Resize frame to thumbnail size; INTER_AREA avoids moire when downscaling
+        width, height = self.size
+        frame_height, frame_width = frame.shape[:2]
+        tolerance = self.RESIZE_TOLERANCE
+        if (width / tolerance <= frame_width <= width * tolerance
+                and height / tolerance <= frame_height <= height * tolerance):
+            return frame
+        return cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+    
+    def _read_thumbnail_av(self, video_path: str) -> Optional[np.ndarray]:
+        """
+        Read the thumbnail frame with PyAV: one keyframe seek to 10% into the video,
+        then swscale converts to BGR and resizes in a single pass
+        Returns: Thumbnail-sized BGR frame, or None to fall back to OpenCV
+        """
+        try:
+            with av.open(video_path) as container:
+                if not container.streams.video:
+                    return None
+                
+                stream = container.streams.video[0]
+                if stream.time_base is None:
+                    return None
+                
+                if stream.duration:
+                    duration = float(stream.duration * stream.time_base)
+                elif container.duration:
+                    duration = container.duration / av.time_base
+                else:
+                    duration = 0.0
+                
+                # Get frame from 10% into the video (avoid black intro frames)
+                target = (stream.start_time or 0) + int(duration * 0.1 / stream.time_base)
+                container.seek(target, stream=stream, backward=True, any_frame=False)
+                
+                for frame in container.decode(stream):
+                    if frame.pts is None or frame.pts >= target:
+                        width, height = self.size
+                        return frame.reformat(width=width, height=height, format='bgr24',
+                                              interpolation='AREA').to_ndarray()
+                
+                return None
+                
+        except Exception:
+            return None
+    
+    def generate_many(self, video_paths: List[str], max_workers: Optional[int] = None,
+                      progress_callback: Optional[Callable[[int, int], None]] = None,
+                      should_stop: Optional[Callable[[], bool]] = None,
+                      video_hashes: Optional[Dict[str, str]] = None) -> Dict[str, Optional[str]]:
+        """
+        Generate thumbnails for many videos, decoding in parallel processes
+        Existing thumbnails are found up front and never sent to a worker, and
+        videos with identical hashes share one decoded thumbnail.
+        Args:
+            should_stop: Polled between videos; remaining videos are skipped once it returns True
+            video_hashes: Optional mapping of video path to its video hash
+        Returns:
+            Dict mapping each processed video path to its thumbnail path or None
+        """
+        results = {}
+        missing = []
+        for video_path in video_paths:
+            thumbnail_path = self.get_thumbnail_path(video_path)
+            if os.path.exists(thumbnail_path):
+                results[video_path] = thumbnail_path
+            else:
+                missing.append((video_path, thumbnail_path))
+        
+        # Only the first video per hash is decoded; the rest reuse its thumbnail
+        video_hashes = video_hashes or {}
+        sources = {video_hashes.get(video_path): video_path for video_path in results}
+        sources.pop(None, None)
+        to_generate, to_link = [], []
+        for video_path, thumbnail_path in missing:
+            video_hash = video_hashes.get(video_path)
+            if video_hash and video_hash in sources:
+                to_link.append((video_path, thumbnail_path, sources[video_hash]))
+            else:
+                if video_hash:
+                    sources[video_hash] = video_path
+                to_generate.append((video_path, thumbnail_path))
+        
+        total = len(video_paths)
+        done = len(results)
+        if progress_callback and done:
+            progress_callback(done, total)
+        
+        done = self._generate_pending(to_generate, results, done, total, max_workers,
+                                      progress_callback, should_stop)
+        if should_stop and should_stop():
+            return results
+        
+        for video_path, thumbnail_path, source_path in to_link:
+            source_thumbnail = results.get(source_path)
+            results[video_path] = (self._link_thumbnail(source_thumbnail, thumbnail_path)
+                                   if source_thumbnail else None)
+            done += 1
+            if progress_callback:
+                progress_callback(done, total)
+        
+        return results
+    
+    def _link_thumbnail(self, source_path: str, thumbnail_path: str) -> Optional[str]:
+        """Reuse an existing thumbnail, as a hard link where the filesystem allows it"""
+        try:
+            try:
+                os.link(source_path, thumbnail_path)
+            except FileExistsError:
+                pass
+            except OSError:
+                shutil.copyfile(source_path, thumbnail_path)
+            return thumbnail_path
+            
+        except Exception as e:
+            logger.error("Error linking thumbnail %s: %s", thumbnail_path, e)
+            return None
+    
+    def _generate_pending(self, to_generate: List[tuple], results: Dict[str, Optional[str]],
+                          done: int, total: int, max_workers: Optional[int],
+                          progress_callback: Optional[Callable[[int, int], None]],
+                          should_stop: Optional[Callable[[], bool]]) -> int:
+        """
+        Decode thumbnails for (video_path, thumbnail_path) pairs into results
+        Returns: Updated count of finished videos
+        """
+        max_workers = min(max_workers or os.cpu_count() or 1, len(to_generate))
+        if max_workers < 2:
+            for video_path, thumbnail_path in to_generate:
+                if should_stop and should_stop():
+                    break
+                results[video_path] = self.generate_thumbnail(video_path, thumbnail_path)
+                done += 1
+                if progress_callback:
+                    progress_callback(done, total)
+            return done
+        
+        # Spawned like the hashing pool: thumbnails are generated from GUI threads
+        executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_thumbnail_worker,
+                                       initargs=(self.thumbnail_dir, self.size),
+                                       mp_context=multiprocessing.get_context("spawn"))
+        try:
+            futures = {executor.submit(_generate_thumbnail_worker, video_path, thumbnail_path): video_path
+                       for video_path, thumbnail_path in to_generate}
+            
+            for future in as_completed(futures):
+                if should_stop and should_stop():
+                    break
+                
+                video_path = futures[future]
+                try:
+                    results[video_path] = future.result()
+                except Exception as e:
+                    logger.error("Error generating thumbnail for %s: %s", video_path, e)
+                    results[video_path] = None
+                
+                done += 1
+                if progress_callback:
+                    progress_callback(done, total)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        
+        return done
+    
     def get_thumbnail_path(self, video_path: str) -> str:
-        """Get the expected thumbnail path for a video"""
-        video_hash = hashlib.md5(video_path.encode()).hexdigest()
-        thumbnail_filename = f"{video_hash}.jpg"
-        return os.path.join(self.thumbnail_dir, thumbnail_filename)
+        """
+        Get the expected thumbnail path for a video
+        A thumbnail still stored under its old MD5 name is renamed into place.
+        """
+        thumbnail_path = os.path.join(self.thumbnail_dir, _thumbnail_filename(video_path))
+        if not os.path.exists(thumbnail_path):
+            self._migrate_md5_thumbnail(video_path, thumbnail_path)
+        return thumbnail_path
+    
+    def _migrate_md5_thumbnail(self, video_path: str, thumbnail_path: str):
+        """Move a thumbnail from its pre-BLAKE2b MD5 file name to thumbnail_path, if one exists"""
+        legacy_name = f"{hashlib.md5(video_path.encode()).hexdigest()}.jpg"
+        try:
+            os.replace(os.path.join(self.thumbnail_dir, legacy_name), thumbnail_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error("Error migrating thumbnail for %s: %s", video_path, e)
     
     def cleanup_thumbnails(self, valid_video_paths: list):
         """Remove thumbnails for videos that no longer exist"""
         try:
-            valid_hashes = set()
-            for video_path in valid_video_paths:
-                video_hash = hashlib.md5(video_path.encode()).hexdigest()
-                valid_hashes.add(f"{video_hash}.jpg")
+            valid_hashes = {_thumbnail_filename(video_path) for video_path in valid_video_paths}
+            
+            if not os.path.isdir(self.thumbnail_dir):
+                return
             
             # Remove thumbnails not in valid set
             removed_count = 0
-            for thumbnail_file in os.listdir(self.thumbnail_dir):
-                if thumbnail_file.endswith('.jpg') and thumbnail_file not in valid_hashes:
-                    thumbnail_path = os.path.join(self.thumbnail_dir, thumbnail_file)
-                    try:
-                        os.remove(thumbnail_path)
-                        removed_count += 1
-                    except:
-                        pass
+            with os.scandir(self.thumbnail_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.jpg') and entry.name not in valid_hashes:
+                        try:
+                            os.remove(entry.path)
+                            removed_count += 1
+                        except:
+                            pass
             
-            print(f"Cleaned up {removed_count} orphaned thumbnails")
+            logger.info("Cleaned up %d orphaned thumbnails", removed_count)
             
         except Exception as e:
-            print(f"Error during thumbnail cleanup: {e}")
+            logger.error("Error during thumbnail cleanup: %s", e)
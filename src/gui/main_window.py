@@ -5,7 +5,9 @@ from pathlib import Path
 import threading
 from typing import List
 import os
+import subprocess
 import sys
+from collections import defaultdict, OrderedDict
 from datetime import datetime
 
 try:
@@ -14,7 +16,23 @@ try:
 except ImportError:
     PIL_AVAILABLE = False
 
+# Add src path for imports
+_src_path = str(Path(__file__).parent.parent)
+if _src_path not in sys.path:
+    sys.path.insert(0, _src_path)
+
+from core.scanner import VideoScanner
+
 class MainWindow:
+    # Result groups inserted into the tree per idle callback
+    RESULTS_CHUNK_SIZE = 50
+    
+    # Preview image size, and how many decoded previews are kept for revisits
+    PREVIEW_SIZE = (200, 150)
+    PHOTO_CACHE_SIZE = 128
+    
+    SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB')
+    
     def __init__(self):
         self.root = tk.Tk()
         self.root.title("Video Duplicate Finder - Python")
@@ -22,8 +40,25 @@ class MainWindow:
         
         self.setup_ui()
         self.scanner = None
+        self.scan_thread = None
+        self.thumbnail_thread = None
         self.duplicate_groups = []
         
+        # Bumped whenever the results are replaced, so pending insert chunks can tell they are stale
+        self._display_generation = 0
+        
+        # Group rows whose file rows are inserted on first expand: tree item -> (files, file sizes)
+        self._unexpanded_groups = {}
+        
+        # Decoded previews keyed by (thumbnail path, mtime), least recently shown first
+        self._photo_cache = OrderedDict()
+        
+        # Long-lived scanner for thumbnail lookups, thumbnail generation and cache clearing;
+        # each scan still gets its own scanner with the current threshold
+        self.cache_scanner = VideoScanner()
+        
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
     def setup_ui(self):
         # Main frame with horizontal split
         main_frame = ttk.Frame(self.root, padding="10")
@@ -120,11 +155,13 @@ class MainWindow:
         
         self.results_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         self.results_tree.bind("<<TreeviewSelect>>", self.on_file_select)
+        self.results_tree.bind("<<TreeviewOpen>>", self.on_group_open)
         
         # Scrollbar for results
-        scrollbar = ttk.Scrollbar(results_frame, orient=tk.VERTICAL, command=self.results_tree.yview)
-        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
-        self.results_tree.configure(yscrollcommand=scrollbar.set)
+        self.results_scrollbar = ttk.Scrollbar(results_frame, orient=tk.VERTICAL,
+                                               command=self.results_tree.yview)
+        self.results_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.results_tree.configure(yscrollcommand=self.results_scrollbar.set)
         
         results_frame.columnconfigure(0, weight=1)
         results_frame.rowconfigure(0, weight=1)
@@ -185,35 +222,43 @@ class MainWindow:
         self.progress_var.set(0)
         self.status_label.config(text="Scanning...")
         
-        # Clear previous results
-        for item in self.results_tree.get_children():
-            self.results_tree.delete(item)
+        # Clear previous results, including any still being inserted
+        self._display_generation += 1
+        self.results_tree.configure(yscrollcommand=self.results_scrollbar.set)
+        self.results_tree.delete(*self.results_tree.get_children())
+        self._unexpanded_groups = {}
         self.duplicate_groups = []
         
         # Start scanning in separate thread
-        self.scan_thread = threading.Thread(target=self._scan_directory, args=(directory,))
+        self.scan_thread = threading.Thread(target=self._scan_directory, args=(directory, self.scan_thread))
         self.scan_thread.start()
     
-    def _scan_directory(self, directory):
+    def _scan_directory(self, directory, previous_thread=None):
         """Run scan in background thread"""
         try:
-            # Add src path for imports
-            src_path = Path(__file__).parent.parent
-            sys.path.insert(0, str(src_path))
-            from core.scanner import VideoScanner
+            # A stopped scan may still be winding down; wait for it before
+            # releasing its scanner's connection
+            if previous_thread:
+                previous_thread.join()
+            if self.scanner:
+                self.scanner.close()
             
-            scanner = VideoScanner(
+            # Kept on self so stop_scan can reach it
+            self.scanner = VideoScanner(
                 similarity_threshold=self.threshold_var.get(),
                 progress_callback=self.update_progress
             )
             
-            duplicates = scanner.scan_directory(directory, use_cache=self.use_cache_var.get())
+            duplicates = self.scanner.scan_directory(directory, use_cache=self.use_cache_var.get())
             
             # Group duplicates
             self.duplicate_groups = self._group_duplicates_by_cluster(duplicates)
             
+            # File sizes are looked up here rather than on the UI thread during insertion
+            file_sizes = self._get_file_sizes(self.duplicate_groups)
+            
             # Update UI in main thread
-            self.root.after(0, self.display_results, self.duplicate_groups)
+            self.root.after(0, self.display_results, self.duplicate_groups, file_sizes)
             
         except Exception as e:
             error_msg = f"Scan failed: {e}"
@@ -226,73 +271,112 @@ class MainWindow:
         if not duplicates:
             return []
         
-        # Simple clustering: group files that appear in multiple pairs
-        file_groups = {}
-        group_id = 0
+        # Union-find over file indices: path halving and union by rank keep
+        # every merge near constant time instead of relabelling a whole group
+        index = {}
+        parent = []
+        rank = []
+        
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
         
         for file1, file2, similarity in duplicates:
-            # Find if either file is already in a group
-            group1 = file_groups.get(file1)
-            group2 = file_groups.get(file2)
+            for file_path in (file1, file2):
+                if file_path not in index:
+                    index[file_path] = len(parent)
+                    parent.append(len(parent))
+                    rank.append(0)
             
-            if group1 is not None and group2 is not None:
-                # Both files already in groups - merge groups if different
-                if group1 != group2:
-                    # Merge groups (update all files in group2 to group1)
-                    for file_path, gid in file_groups.items():
-                        if gid == group2:
-                            file_groups[file_path] = group1
-            elif group1 is not None:
-                # file1 in group, add file2
-                file_groups[file2] = group1
-            elif group2 is not None:
-                # file2 in group, add file1
-                file_groups[file1] = group2
-            else:
-                # Neither file in a group, create new group
-                file_groups[file1] = group_id
-                file_groups[file2] = group_id
-                group_id += 1
-        
-        # Convert to list of groups
-        groups = {}
-        for file_path, gid in file_groups.items():
-            if gid not in groups:
-                groups[gid] = []
-            groups[gid].append(file_path)
+            root1, root2 = find(index[file1]), find(index[file2])
+            if root1 == root2:
+                continue
+            if rank[root1] < rank[root2]:
+                root1, root2 = root2, root1
+            parent[root2] = root1
+            if rank[root1] == rank[root2]:
+                rank[root1] += 1
+        
+        # Convert to list of groups, in order of first appearance
+        groups = defaultdict(list)
+        for file_path, i in index.items():
+            groups[find(i)].append(file_path)
         
         return list(groups.values())
     
+    def _get_file_sizes(self, duplicate_groups):
+        """Map every grouped file to its size in bytes, or None if it cannot be read"""
+        file_sizes = {}
+        for group in duplicate_groups:
+            for file_path in group:
+                try:
+                    file_sizes[file_path] = os.path.getsize(file_path)
+                except OSError:
+                    file_sizes[file_path] = None
+        return file_sizes
+    
     def update_progress(self, current, total):
         """Update progress bar - called from background thread"""
         progress = (current / total) * 100 if total > 0 else 0
         self.root.after(0, lambda: self.progress_var.set(progress))
     
-    def display_results(self, duplicate_groups):
+    def display_results(self, duplicate_groups, file_sizes):
         """Display scan results"""
         self.status_label.config(text=f"Found {len(duplicate_groups)} duplicate groups")
         
-        for i, group in enumerate(duplicate_groups):
+        # Rows go in a chunk at a time from idle callbacks so the window stays
+        # responsive; scrollbar updates are suspended until the last chunk
+        self._display_generation += 1
+        self.results_tree.configure(yscrollcommand="")
+        self.root.after_idle(self._insert_results_chunk, duplicate_groups, file_sizes,
+                             0, self._display_generation)
+    
+    def _insert_results_chunk(self, duplicate_groups, file_sizes, start, generation):
+        """Insert up to RESULTS_CHUNK_SIZE groups into the results tree"""
+        if generation != self._display_generation:
+            return
+        
+        end = min(start + self.RESULTS_CHUNK_SIZE, len(duplicate_groups))
+        for i in range(start, end):
+            group = duplicate_groups[i]
             group_id = self.results_tree.insert("", "end", text=f"Group {i+1} ({len(group)} files)", 
                                                values=("", "", ""))
             
-            for file_path in group:
-                try:
-                    file_size = os.path.getsize(file_path)
-                    size_str = self._format_file_size(file_size)
-                except:
-                    size_str = "Unknown"
-                
-                self.results_tree.insert(group_id, "end", text=Path(file_path).name, 
-                                       values=("", size_str, ""), tags=(file_path,))
+            # A placeholder row keeps the group expandable until its files are inserted
+            self.results_tree.insert(group_id, "end", text="Loading...", values=("", "", ""))
+            self._unexpanded_groups[group_id] = (group, file_sizes)
+        
+        if end < len(duplicate_groups):
+            self.root.after_idle(self._insert_results_chunk, duplicate_groups, file_sizes,
+                                 end, generation)
+        else:
+            self.results_tree.configure(yscrollcommand=self.results_scrollbar.set)
+    
+    def on_group_open(self, event):
+        """Insert a group's file rows the first time it is expanded"""
+        group_id = self.results_tree.focus()
+        pending = self._unexpanded_groups.pop(group_id, None)
+        if pending is None:
+            return
+        
+        group, file_sizes = pending
+        self.results_tree.delete(*self.results_tree.get_children(group_id))
+        
+        for file_path in group:
+            file_size = file_sizes.get(file_path)
+            size_str = self._format_file_size(file_size) if file_size is not None else "Unknown"
+            
+            self.results_tree.insert(group_id, "end", text=os.path.basename(file_path), 
+                                   values=("", size_str, ""), tags=(file_path,))
     
     def _format_file_size(self, size_bytes):
         """Format file size in human readable format"""
-        for unit in ['B', 'KB', 'MB', 'GB']:
-            if size_bytes < 1024.0:
-                return f"{size_bytes:.1f} {unit}"
-            size_bytes /= 1024.0
-        return f"{size_bytes:.1f} TB"
+        # Every unit is 2**10 of the previous one, so the bit length picks it directly
+        size_bytes = int(size_bytes)
+        unit = min(max(size_bytes.bit_length() - 1, 0) // 10, len(self.SIZE_UNITS) - 1)
+        return f"{size_bytes / (1 << (10 * unit)):.1f} {self.SIZE_UNITS[unit]}"
     
     def on_file_select(self, event):
         """Handle file selection in tree"""
@@ -332,19 +416,11 @@ class MainWindow:
     def load_thumbnail(self, file_path):
         """Load and display thumbnail for video file"""
         try:
-            src_path = Path(__file__).parent.parent
-            sys.path.insert(0, str(src_path))
-            from core.scanner import VideoScanner
-            
-            scanner = VideoScanner()
-            thumbnail_path = scanner.get_file_thumbnail(file_path)
+            thumbnail_path = self.cache_scanner.get_file_thumbnail(file_path)
+            photo = self._load_photo(thumbnail_path) if thumbnail_path and PIL_AVAILABLE else None
             
-            if thumbnail_path and os.path.exists(thumbnail_path) and PIL_AVAILABLE:
-                # Load and display thumbnail
-                image = Image.open(thumbnail_path)
-                image = image.resize((200, 150), Image.Resampling.LANCZOS)
-                photo = ImageTk.PhotoImage(image)
-                
+            if photo:
+                # Display thumbnail
                 self.thumbnail_label.config(image=photo, text="")
                 self.thumbnail_label.image = photo  # Keep a reference
             else:
@@ -356,6 +432,30 @@ class MainWindow:
             self.thumbnail_label.config(image="", text="Thumbnail error")
             self.thumbnail_label.image = None
     
+    def _load_photo(self, thumbnail_path):
+        """PhotoImage for a thumbnail file, decoded once per version of the file"""
+        try:
+            key = (thumbnail_path, os.stat(thumbnail_path).st_mtime_ns)
+        except OSError:
+            return None
+        
+        photo = self._photo_cache.get(key)
+        if photo is not None:
+            self._photo_cache.move_to_end(key)
+            return photo
+        
+        with Image.open(thumbnail_path) as image:
+            # Lets the JPEG decoder scale down while decoding if the file is larger than the preview
+            image.draft("RGB", self.PREVIEW_SIZE)
+            # Fit inside the preview box, keeping the aspect ratio
+            image.thumbnail(self.PREVIEW_SIZE, Image.Resampling.LANCZOS)
+            photo = ImageTk.PhotoImage(image)
+        
+        self._photo_cache[key] = photo
+        if len(self._photo_cache) > self.PHOTO_CACHE_SIZE:
+            self._photo_cache.popitem(last=False)
+        return photo
+    
     def scan_complete(self):
         """Reset UI after scan completion"""
         self.scan_button.config(state=tk.NORMAL)
@@ -372,12 +472,8 @@ class MainWindow:
     def clear_cache(self):
         """Clear all cached data"""
         try:
-            src_path = Path(__file__).parent.parent
-            sys.path.insert(0, str(src_path))
-            from core.scanner import VideoScanner
-            
-            scanner = VideoScanner()
-            scanner.clear_cache()
+            self.cache_scanner.clear_cache()
+            self._photo_cache.clear()
             messagebox.showinfo("Cache Cleared", "All cached data has been cleared")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to clear cache: {e}")
@@ -400,24 +496,18 @@ class MainWindow:
         self.status_label.config(text="Generating thumbnails...")
         self.progress_var.set(0)
         
-        thread = threading.Thread(target=self._generate_thumbnails_background, 
-                                 args=(list(all_files),))
-        thread.start()
+        self.thumbnail_thread = threading.Thread(target=self._generate_thumbnails_background,
+                                                 args=(list(all_files),))
+        self.thumbnail_thread.start()
     
     def _generate_thumbnails_background(self, file_paths):
         """Generate thumbnails in background thread"""
         try:
-            src_path = Path(__file__).parent.parent
-            sys.path.insert(0, str(src_path))
-            from core.scanner import VideoScanner
-            
-            scanner = VideoScanner()
-            
             def progress_callback(current, total):
                 progress = (current / total) * 100 if total > 0 else 0
                 self.root.after(0, lambda: self.progress_var.set(progress))
             
-            scanner.generate_thumbnails(file_paths, progress_callback)
+            self.cache_scanner.generate_thumbnails(file_paths, progress_callback)
             
             self.root.after(0, lambda: self.status_label.config(text="Thumbnails generated"))
             
@@ -436,13 +526,16 @@ class MainWindow:
         
         if tags:
             file_path = tags[0]
+            # Launched without a shell and not waited on, so the UI never blocks
             try:
-                os.startfile(file_path)  # Windows
-            except:
-                try:
-                    os.system(f'open "{file_path}"')  # macOS
-                except:
-                    os.system(f'xdg-open "{file_path}"')  # Linux
+                if sys.platform == 'win32':
+                    os.startfile(file_path)
+                elif sys.platform == 'darwin':
+                    subprocess.Popen(['open', file_path], close_fds=True)
+                else:
+                    subprocess.Popen(['xdg-open', file_path], close_fds=True)
+            except Exception as e:
+                print(f"Error opening file: {e}")
     
     def delete_selected_file(self):
         """Delete selected file after confirmation"""
@@ -477,9 +570,27 @@ class MainWindow:
         if tags:
             file_path = tags[0]
             try:
-                os.system(f'explorer /select,"{file_path}"')
+                subprocess.Popen(['explorer', '/select,', file_path], close_fds=True)
             except Exception as e:
                 print(f"Error showing in explorer: {e}")
     
+    def on_close(self):
+        """Stop any running scan or thumbnail generation and release database connections before exiting"""
+        if self.scanner:
+            self.scanner.stop()
+        self.cache_scanner.stop()
+        
+        # Background threads still use their scanners' connections and post to the
+        # event loop, so poll for them from it instead of blocking on join
+        if any(thread and thread.is_alive() for thread in (self.scan_thread, self.thumbnail_thread)):
+            self.status_label.config(text="Stopping...")
+            self.root.after(100, self.on_close)
+            return
+        
+        if self.scanner:
+            self.scanner.close()
+        self.cache_scanner.close()
+        self.root.destroy()
+    
     def run(self):
         self.root.mainloop()
\ No newline at end of file
@@ -6,6 +6,7 @@ Fast and efficient video duplicate detection for large collections
 
 import sys
 import os
+import logging
 from pathlib import Path
 
 # Add src to path for relative imports
@@ -14,6 +15,8 @@ sys.path.insert(0, str(src_path))
 
 def main():
     """Main entry point for the application"""
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    
     try:
         from gui.main_window import MainWindow
         
@@ -0,0 +1,6 @@
+# tests/conftest.py
+import sys
+from pathlib import Path
+
+# The application imports its packages from src/, as src/main.py does
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
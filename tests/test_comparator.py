@@ -0,0 +1,175 @@
+# tests/test_comparator.py
+import numpy as np
+import pytest
+
+from core.comparator import EfficientComparator
+from core.hasher import PerceptualHasher
+
+
+def _random_frames(rng, frames: int) -> np.ndarray:
+    return rng.integers(0, 1 << 64, size=(frames, 2), dtype=np.uint64)
+
+
+def _flip_bits(rng, frame_words: np.ndarray, fraction: float) -> np.ndarray:
+    """Copy of frame_words with a random `fraction` of its bits inverted"""
+    bits = np.unpackbits(frame_words.view(np.uint8))
+    flips = rng.choice(len(bits), size=int(round(fraction * len(bits))), replace=False)
+    bits[flips] ^= 1
+    return np.packbits(bits).view(np.uint64).reshape(frame_words.shape)
+
+
+def _brute_force(hasher, file_hashes, threshold):
+    paths = list(file_hashes)
+    pairs = {}
+    for a in range(len(paths)):
+        for b in range(a + 1, len(paths)):
+            similarity = hasher.compute_similarity(file_hashes[paths[a]], file_hashes[paths[b]])
+            if similarity >= threshold:
+                pairs[frozenset((paths[a], paths[b]))] = similarity
+    return pairs
+
+
+def _as_dict(duplicates):
+    pairs = {}
+    for file1, file2, similarity in duplicates:
+        key = frozenset((file1, file2))
+        assert key not in pairs
+        pairs[key] = similarity
+    return pairs
+
+
+def test_bucket_with_mixed_hash_layouts_matches_compute_similarity():
+    rng = np.random.default_rng(1)
+    hasher = PerceptualHasher()
+    comparator = EfficientComparator(0.8, num_workers=1, hasher=hasher)
+    comparator.TILE_BYTES = 8 * 20 * 16 ** 2
+
+    # Short clips are prefixes of long videos, so pairs across layouts can match
+    file_hashes = {}
+    for video in range(12):
+        frame_words = _random_frames(rng, 10)
+        for copy in range(2):
+            file_hashes[f"{video}_{copy}.mp4"] = hasher._combine_hashes(_flip_bits(rng, frame_words, 0.05))
+        file_hashes[f"{video}_clip.mp4"] = hasher._combine_hashes(_flip_bits(rng, frame_words[:7], 0.05))
+
+    packed = comparator._pack_hashes(file_hashes)
+    found = _as_dict((packed.paths[i], packed.paths[j], similarity) for i, j, similarity
+                     in comparator._compare_bucket(np.arange(len(packed.paths)), 0, packed))
+
+    expected = _brute_force(hasher, file_hashes, 0.8)
+    assert any(any(path.endswith("clip.mp4") for path in pair) for pair in expected)
+    assert found.keys() == expected.keys()
+    for pair, similarity in expected.items():
+        assert found[pair] == similarity
+
+
+def _video_pairs(rng, hasher, pairs: int, flip_fraction: float, flat_frames: int = 0):
+    """Hashes of `pairs` random 10-frame videos, each with a copy that has bits flipped"""
+    file_hashes = {}
+    for video in range(pairs):
+        frame_words = _random_frames(rng, 10)
+        # Black intro frames: empty dhash, phash of rounding noise
+        frame_words[:flat_frames, 0] = 0
+        file_hashes[f"{video}_a.mp4"] = hasher._combine_hashes(frame_words)
+        file_hashes[f"{video}_b.mp4"] = hasher._combine_hashes(_flip_bits(rng, frame_words, flip_fraction))
+    return file_hashes
+
+
+@pytest.mark.parametrize("threshold, flip_fraction", [
+    (0.8, 0.10), (0.8, 0.15), (0.8, 0.25), (0.9, 0.05), (0.9, 0.12)])
+def test_lsh_buckets_find_pairs_within_the_threshold(threshold, flip_fraction):
+    rng = np.random.default_rng(2)
+    hasher = PerceptualHasher()
+    comparator = EfficientComparator(threshold, num_workers=1, hasher=hasher)
+    # Keep the LSH buckets even though comparing every pair would be cheaper here
+    comparator.BUCKET_COST_PAIRS = 0
+    file_hashes = _video_pairs(rng, hasher, 300, flip_fraction)
+
+    pairs, large_buckets = comparator._create_hash_buckets(comparator._pack_hashes(file_hashes))
+    assert len(pairs) and not large_buckets
+    found = {frozenset(pair[:2]) for pair in comparator.find_duplicates(file_hashes)}
+
+    recalled = sum(frozenset((f"{video}_a.mp4", f"{video}_b.mp4")) in found for video in range(300))
+    assert recalled >= 297
+
+
+def test_flat_intro_frames_do_not_share_buckets():
+    rng = np.random.default_rng(3)
+    hasher = PerceptualHasher()
+    comparator = EfficientComparator(0.9, num_workers=1, hasher=hasher)
+    comparator.BUCKET_COST_PAIRS = 0
+    file_hashes = _video_pairs(rng, hasher, 100, 0.05, flat_frames=2)
+
+    pairs, large_buckets = comparator._create_hash_buckets(comparator._pack_hashes(file_hashes))
+
+    assert not large_buckets
+    # Each copy pair and a few chance collisions, not every file against every other
+    assert len(pairs) <= 200
+    assert len(comparator.find_duplicates(file_hashes)) == 100
+
+
+def test_few_files_are_compared_in_one_bucket():
+    rng = np.random.default_rng(4)
+    hasher = PerceptualHasher()
+    comparator = EfficientComparator(0.8, num_workers=1, hasher=hasher)
+    packed = comparator._pack_hashes(_video_pairs(rng, hasher, 20, 0.1))
+
+    pairs, large_buckets = comparator._create_hash_buckets(packed)
+
+    assert not len(pairs)
+    assert len(large_buckets) == 1
+    assert large_buckets[0][1].tolist() == list(range(40))
+
+
+def test_pairs_sharing_many_bands_are_compared_once():
+    rng = np.random.default_rng(5)
+    hasher = PerceptualHasher()
+    comparator = EfficientComparator(0.9, num_workers=1, hasher=hasher)
+    comparator.BUCKET_COST_PAIRS = 0
+    # Every video opens on the same textured title card, which fills buckets larger than a tile
+    file_hashes = _video_pairs(rng, hasher, 150, 0.05)
+    title_card = _random_frames(rng, 2)
+    for path, file_hash in file_hashes.items():
+        frame_count, words, _ = hasher.hash_to_words(file_hash)
+        words = words.reshape(frame_count, 2)
+        words[:2] = title_card
+        file_hashes[path] = hasher._combine_hashes(words)
+
+    pairs, large_buckets = comparator._create_hash_buckets(comparator._pack_hashes(file_hashes))
+    assert large_buckets
+    assert len({tuple(pair) for pair in pairs.tolist()}) == len(pairs)
+
+    found = _as_dict(comparator.find_duplicates(file_hashes))
+    assert found == _brute_force(hasher, file_hashes, 0.9)
+    assert len(found) == 150
+
+
+def _mixed_collection(rng, hasher):
+    """Copies, short clips and flat-intro videos, with far more unrelated than duplicate pairs"""
+    file_hashes = _video_pairs(rng, hasher, 40, 0.05, flat_frames=1)
+    for video in range(20):
+        frame_words = _random_frames(rng, 10)
+        file_hashes[f"{video}_long.mp4"] = hasher._combine_hashes(frame_words)
+        file_hashes[f"{video}_clip.mp4"] = hasher._combine_hashes(_flip_bits(rng, frame_words[:8], 0.03))
+    file_hashes["empty.mp4"] = ""
+    return file_hashes
+
+
+@pytest.mark.parametrize("bucket_cost_pairs", [0, EfficientComparator.BUCKET_COST_PAIRS])
+@pytest.mark.parametrize("parallel", [False, True])
+def test_find_duplicates_matches_brute_force(bucket_cost_pairs, parallel):
+    rng = np.random.default_rng(6)
+    hasher = PerceptualHasher()
+    comparator = EfficientComparator(0.85, num_workers=2, hasher=hasher)
+    comparator.BUCKET_COST_PAIRS = bucket_cost_pairs
+    comparator.PARALLEL_MIN_PAIRS = 0
+    # Several tiles per bucket
+    comparator.TILE_BYTES = 8 * 20 * 16 ** 2
+    file_hashes = _mixed_collection(rng, hasher)
+
+    find = comparator.find_duplicates_parallel if parallel else comparator.find_duplicates
+    found = _as_dict(find(file_hashes))
+
+    expected = _brute_force(hasher, {path: file_hash for path, file_hash in file_hashes.items() if file_hash}, 0.85)
+    assert len(expected) == 60
+    assert found == expected
@@ -0,0 +1,51 @@
+# tests/test_hamming.py
+import numpy as np
+
+from core import hamming
+from core.hash_index import BKTree
+
+
+def _flip(words: np.ndarray, bits) -> np.ndarray:
+    """Copy of a uint64 table with the given flat bit positions inverted"""
+    flipped = words.copy().ravel()
+    for bit in bits:
+        flipped[bit // 64] ^= np.uint64(1 << (bit % 64))
+    return flipped.reshape(words.shape)
+
+
+def test_popcount_matches_python():
+    words = np.array([0, 1, 0xFF, 1 << 63, (1 << 64) - 1, 0x0123456789ABCDEF], dtype=np.uint64)
+    assert hamming.popcount(words).tolist() == [bin(int(word)).count('1') for word in words]
+
+
+def test_hamming_and_pairwise_distances():
+    query = np.array([0xF0F0F0F0F0F0F0F0, 0x1], dtype=np.uint64)
+    table = np.stack([query, _flip(query, [0]), _flip(query, [3, 70, 127])])
+
+    assert hamming.hamming_distances(query, table).tolist() == [0, 1, 3]
+    assert hamming.pairwise_distances(table, table).tolist() == [[0, 1, 3], [1, 0, 4], [3, 4, 0]]
+
+
+def test_within_distance():
+    query = np.zeros(2, dtype=np.uint64)
+    table = np.stack([_flip(query, range(flips)) for flips in (0, 2, 5, 9)])
+
+    assert hamming.within_distance(query, table, 5).tolist() == [True, True, True, False]
+    assert hamming.within_distance(query, table[:0], 5).tolist() == []
+
+
+def test_bit_distance():
+    assert hamming.bit_distance(0b1011, 0b0001) == 2
+    assert hamming.bit_distance(1 << 127, 0) == 1
+
+
+def test_bk_tree_radius_query():
+    tree = BKTree()
+    keys = {'a': 0, 'b': 0b1, 'c': 0b111, 'd': (1 << 100) | 0b1111, 'e': 0}
+    for value, key in keys.items():
+        tree.add(key, value)
+
+    assert len(tree) == 5
+    assert sorted(tree.query(0, 1)) == [(0, 'a'), (0, 'e'), (1, 'b')]
+    assert sorted(value for _, value in tree.query(0b11, 2)) == ['a', 'b', 'c', 'e']
+    assert BKTree().query(0, 10) == []
@@ -0,0 +1,134 @@
+# tests/test_hasher.py
+import numpy as np
+import pytest
+
+from core.hasher import PerceptualHasher, _bits_to_words
+
+
+def _synthetic_frame() -> np.ndarray:
+    """Fixed 320x240 BGR frame with structure at several frequencies"""
+    y, x = np.mgrid[0:240, 0:320]
+    gray = (((x * 7 + y * 13) % 256) ^ ((x * y) % 97)).astype(np.uint8)
+    return np.dstack([gray, gray[::-1], gray[:, ::-1]])
+
+
+def test_frame_hash_is_stable():
+    """dhash and phash bits of a fixed frame must not drift between releases"""
+    words = PerceptualHasher()._compute_frame_words([_synthetic_frame()])
+
+    assert words.shape == (1, 2)
+    assert [int(word) for word in words[0]] == [0x502c52c110a18a15, 0xa16d31dfaa411af4]
+
+
+def test_grayscale_and_bgr_frames_hash_alike():
+    frame = _synthetic_frame()
+    hasher = PerceptualHasher()
+    gray = hasher._shrink_frame(frame)
+
+    assert gray.shape == (32, 32)
+    np.testing.assert_array_equal(hasher._compute_frame_words([frame]),
+                                  hasher._compute_frame_words([gray]))
+
+
+def test_phash_matches_imagehash():
+    """On the shrunk gray frame, phash reproduces imagehash.phash bit for bit"""
+    imagehash = pytest.importorskip("imagehash")
+    Image = pytest.importorskip("PIL.Image")
+
+    hasher = PerceptualHasher()
+    gray = hasher._shrink_frame(_synthetic_frame())
+    expected = imagehash.phash(Image.fromarray(gray)).hash.flatten()
+
+    np.testing.assert_array_equal(hasher._phash(gray[None])[0], expected)
+
+
+def test_flat_frame_has_empty_dhash():
+    hasher = PerceptualHasher()
+    gray = np.full((32, 32), 40, dtype=np.uint8)
+
+    assert not hasher._dhash(gray[None]).any()
+
+
+def test_bits_to_words_packs_most_significant_bit_first():
+    bits = np.zeros((2, 70), dtype=bool)
+    bits[0, 0] = True
+    bits[1, 63] = True
+    bits[1, 64] = True
+
+    words = _bits_to_words(bits)
+
+    assert words.dtype == np.uint64
+    assert words.tolist() == [[1 << 63, 0], [1, 1 << 63]]
+
+
+def test_video_hash_round_trip():
+    hasher = PerceptualHasher()
+    frame_words = hasher._compute_frame_words([_synthetic_frame(), _synthetic_frame()[::-1]])
+    video_hash = hasher._combine_hashes(frame_words)
+
+    frame_count, words, total_bits = hasher.hash_to_words(video_hash)
+
+    assert frame_count == 2
+    assert total_bits == 256
+    np.testing.assert_array_equal(words, frame_words.ravel())
+    assert hasher.is_valid_hash(video_hash)
+    assert not hasher.is_valid_hash("10:0123abcd:0123456789abcdef")
+
+
+def _flipped_hash(hasher, frame_words: np.ndarray, flips: int) -> str:
+    """Video hash of frame_words with the lowest bit of the first `flips` words inverted"""
+    flipped = frame_words.copy().ravel()
+    flipped[:flips] ^= np.uint64(1)
+    return hasher._combine_hashes(flipped.reshape(frame_words.shape))
+
+
+def test_compare_many_agrees_with_compare_hash_words():
+    hasher = PerceptualHasher()
+    frame_words = np.array([[0x0F0F0F0F0F0F0F0F, 0xFF00FF00FF00FF00],
+                            [0x123456789ABCDEF0, 0x0]], dtype=np.uint64)
+    query = hasher._combine_hashes(frame_words)
+    hashes = [query,
+              _flipped_hash(hasher, frame_words, 1),
+              _flipped_hash(hasher, frame_words, 3),
+              hasher._combine_hashes(frame_words[:1]),
+              "10:0123abcd:0123456789abcdef",
+              ""]
+
+    similarities = hasher.compare_many(query, hashes)
+
+    query_words = tuple(hasher.hash_to_words(query)[1].tolist())
+    for video_hash, flips, similarity in zip(hashes, [0, 1, 3], similarities):
+        words = tuple(hasher.hash_to_words(video_hash)[1].tolist())
+        assert hasher._compare_hash_words(query_words, words, 256) == 1.0 - flips / 256
+        assert similarity == pytest.approx(0.3 + 0.7 * (1.0 - flips / 256))
+    # Different frame count takes the compute_similarity path
+    assert similarities[3] == pytest.approx(hasher.compute_similarity(query, hashes[3]))
+    assert similarities[3] == pytest.approx(0.3 * 0.5 + 0.7)
+    assert similarities[4:].tolist() == [0.0, 0.0]
+
+    assert hasher.match_many(query, hashes, 0.995).tolist() == [True, True, False, False, False, False]
+    assert hasher.match_many(query, []).tolist() == []
+
+
+def test_index_finds_hashes_within_radius():
+    hasher = PerceptualHasher()
+    frame_words = np.array([[0xAAAAAAAAAAAAAAAA, 0x5555555555555555]], dtype=np.uint64)
+    query = hasher._combine_hashes(frame_words)
+    index = hasher.build_index({"same.mp4": query,
+                                "near.mp4": _flipped_hash(hasher, frame_words, 2),
+                                "far.mp4": hasher._combine_hashes(~frame_words),
+                                "broken.mp4": "not a hash"})
+
+    assert len(index) == 3
+    assert hasher.fingerprint(query) == (0xAAAAAAAAAAAAAAAA << 64) | 0x5555555555555555
+    assert sorted(hasher.query_index(index, query, radius=2)) == ["near.mp4", "same.mp4"]
+    assert hasher.query_index(index, query, radius=1) == ["same.mp4"]
+    assert hasher.query_index(index, "not a hash") == []
+
+
+def test_fingerprint_skips_flat_intro_frames():
+    hasher = PerceptualHasher()
+    frame_words = np.array([[0, 0x0F0F], [0xAAAAAAAAAAAAAAAA, 0x5555555555555555]], dtype=np.uint64)
+
+    assert hasher.fingerprint(hasher._combine_hashes(frame_words)) == (0xAAAAAAAAAAAAAAAA << 64) | 0x5555555555555555
+    assert hasher.fingerprint(hasher._combine_hashes(frame_words[:1])) == 0x0F0F
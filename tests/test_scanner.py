@@ -0,0 +1,65 @@
+# tests/test_scanner.py
+import numpy as np
+import pytest
+
+from core.scanner import VideoScanner
+
+
+@pytest.fixture
+def scanner(tmp_path):
+    scanner = VideoScanner(db_path=str(tmp_path / "videos.db"), num_workers=2)
+    yield scanner
+    scanner.close()
+
+
+def _write(path, data: bytes) -> str:
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.mark.parametrize("max_full", [8, 1])
+def test_identical_files_need_matching_full_content(scanner, tmp_path, max_full):
+    """Equal size and equal leading bytes are not enough to call two files identical"""
+    scanner.FULL_DIGEST_MAX_FILES = max_full
+    scanner.HEAD_BYTES = 16
+    header = b"\x00\x00\x00\x18ftypmp42" + bytes(4)
+
+    original = _write(tmp_path / "a.mp4", header + b"first body")
+    copy = _write(tmp_path / "b.mp4", header + b"first body")
+    same_head = _write(tmp_path / "c.mp4", header + b"other body")
+    other_size = _write(tmp_path / "d.mp4", header + b"longer body")
+
+    identical = scanner._find_identical_files([original, copy, same_head, other_size])
+
+    assert identical == {original: [copy]}
+
+
+def test_cached_rescan_reads_no_file_content(tmp_path):
+    """Copies are found among uncached files only, so a cached rescan just stats files"""
+    scanner = VideoScanner(db_path=str(tmp_path / "videos.db"), num_workers=1)
+    body = b"\x00\x00\x00\x18ftypmp42" + bytes(20)
+    files = [_write(tmp_path / "a.mp4", body), _write(tmp_path / "b.mp4", body),
+             _write(tmp_path / "c.mp4", body[::-1])]
+
+    decoded = []
+
+    def compute_video_hash(file_path):
+        decoded.append(file_path)
+        return scanner.hasher._combine_hashes(np.array([[len(decoded), 1]], dtype=np.uint64))
+
+    digests = []
+    file_digest = scanner._file_digest
+    scanner.hasher.compute_video_hash = compute_video_hash
+    scanner._file_digest = lambda file_path, full: digests.append(file_path) or file_digest(file_path, full)
+    try:
+        first = scanner._process_files(files, use_cache=True)
+        assert sorted(decoded) == [files[0], files[2]]
+        assert first[files[0]] == first[files[1]] != first[files[2]]
+        assert len(digests) == 3
+
+        decoded.clear()
+        digests.clear()
+        assert scanner._process_files(files, use_cache=True) == first
+        assert decoded == [] and digests == []
+    finally:
+        scanner.close()
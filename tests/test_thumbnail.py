@@ -0,0 +1,32 @@
+# tests/test_thumbnail.py
+import hashlib
+import os
+
+from core.thumbnail import ThumbnailGenerator
+
+
+def test_md5_named_thumbnail_is_migrated(tmp_path):
+    generator = ThumbnailGenerator(str(tmp_path / "thumbnails"))
+    video_path = str(tmp_path / "missing.mp4")
+    legacy_path = os.path.join(generator.thumbnail_dir,
+                               f"{hashlib.md5(video_path.encode()).hexdigest()}.jpg")
+    with open(legacy_path, "wb") as f:
+        f.write(b"jpeg")
+
+    # The video does not exist, so the thumbnail can only come from the old file
+    results = generator.generate_many([video_path], max_workers=1)
+
+    thumbnail_path = generator.get_thumbnail_path(video_path)
+    assert results == {video_path: thumbnail_path}
+    assert thumbnail_path != legacy_path
+    assert not os.path.exists(legacy_path)
+    with open(thumbnail_path, "rb") as f:
+        assert f.read() == b"jpeg"
+
+
+def test_missing_thumbnail_without_legacy_file(tmp_path):
+    generator = ThumbnailGenerator(str(tmp_path / "thumbnails"))
+    video_path = str(tmp_path / "missing.mp4")
+
+    assert generator.generate_many([video_path], max_workers=1) == {video_path: None}
+    assert os.listdir(generator.thumbnail_dir) == []